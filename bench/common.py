@@ -0,0 +1,71 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Helpers shared by the benchmark scripts.
+
+The benchmarks are run from the top-level source directory, e.g.
+    python3 -m bench.modify
+"""
+
+import contextlib
+import os.path
+import shutil
+import tempfile
+import time
+
+from tdlib        import config
+from tdlib.repo   import repository
+
+def config_make(repo_path):
+    """
+    Create the default config for the td repository in repo_path.
+    """
+    conf = config.Config()
+    conf['repo_path'] = repo_path
+    return conf
+
+@contextlib.contextmanager
+def temp_repo():
+    """
+    Create a new empty td repository in a temporary directory, yield a
+    (Repository, Config) tuple for it and remove it afterwards.
+    """
+    tmpdir = tempfile.mkdtemp(prefix = 'td-bench-')
+    try:
+        path = os.path.join(tmpdir, 'repo')
+        repository.init(path)
+
+        conf = config_make(path)
+
+        yield repository.Repository(path, conf['lib']), conf
+    finally:
+        shutil.rmtree(tmpdir)
+
+class Timer:
+    """
+    A context manager measuring the wall-clock time spent inside it, in
+    seconds.
+    """
+    elapsed = None
+
+    _start  = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self._start
@@ -0,0 +1,68 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare the results of bench.run from two or more runs, e.g. on different
+commits. The best time of every benchmark is printed for every run, with its
+ratio to the first run.
+"""
+
+import argparse
+import json
+import sys
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = 'bench.compare')
+    parser.add_argument('results', nargs = '+',
+                        help = 'Files with the results written by bench.run, the first one is the base')
+    args = parser.parse_args(argv[1:])
+
+    runs = []
+    for path in args.results:
+        with open(path, 'r') as f:
+            runs.append(json.load(f))
+
+    base = runs[0]
+    for i, run in enumerate(runs):
+        commit = run['commit'] or 'unknown'
+        sys.stdout.write('[%d] %s  %s\n' % (i, commit[:12], args.results[i]))
+        if run['params'] != base['params']:
+            sys.stdout.write('    warning: different parameters than [0]\n')
+
+    names = list(base['results'])
+    for run in runs[1:]:
+        names += [name for name in run['results'] if not name in names]
+
+    sys.stdout.write('\n%-12s' % 'benchmark')
+    for i in range(len(runs)):
+        sys.stdout.write(' %18s' % ('[%d]' % i))
+    sys.stdout.write('\n')
+
+    for name in names:
+        sys.stdout.write('%-12s' % name)
+        base_time = base['results'].get(name, {}).get('best')
+        for run in runs:
+            best = run['results'].get(name, {}).get('best')
+            if best is None:
+                col = '-'
+            elif base_time:
+                col = '%.3f s (%.2fx)' % (best, best / base_time)
+            else:
+                col = '%.3f s' % best
+            sys.stdout.write(' %18s' % col)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
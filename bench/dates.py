@@ -0,0 +1,57 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare the cost of decoding canonical repository timestamps with the
+generic dateutil parser and with tdlib.utils.dates.
+"""
+
+import argparse
+import datetime
+import dateutil.parser
+import random
+import sys
+
+from tdlib.utils import dates
+
+from . import common
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = 'bench.dates')
+    parser.add_argument('-n', '--count', type = int, default = 100000,
+                        help = 'Number of timestamps to decode')
+    args = parser.parse_args(argv[1:])
+
+    rng   = random.Random(0)
+    epoch = datetime.datetime(2010, 1, 1, tzinfo = datetime.timezone.utc)
+    strings = []
+    for i in range(args.count):
+        d = epoch + datetime.timedelta(seconds = rng.randrange(10 * 365 * 86400),
+                                       microseconds = rng.randrange(1000000))
+        strings.append(d.isoformat())
+
+    results = {}
+    for name, func in (('dateutil', dateutil.parser.parse), ('td', dates.parse)):
+        with common.Timer() as timer:
+            results[name] = list(map(func, strings))
+        sys.stdout.write('%-8s: %8.3f s total, %6.2f us per date\n' %
+                         (name, timer.elapsed, timer.elapsed * 1e6 / args.count))
+
+    if results['dateutil'] != results['td']:
+        sys.stdout.write('MISMATCH between the decoded values\n')
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
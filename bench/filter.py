@@ -0,0 +1,88 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare evaluating a filter expression by interpreting its parse tree with
+evaluating the compiled filter, on in-memory tasks.
+"""
+
+import argparse
+import datetime
+import random
+import sys
+
+from tdlib.repo      import filter as task_filter
+from tdlib.repo.task import StandaloneTask
+
+from . import common
+
+DEFAULT_FILTER = ('text:report and ( +projects.work or +home ) and '
+                  'not flag:blocked and urgency.above:1.0 and not id:7')
+
+def make_tasks(count, seed = 0):
+    """
+    Create count in-memory tasks looking like ones loaded from a repository.
+    """
+    rng   = random.Random(seed)
+    words = ('report', 'email', 'fix', 'review', 'call', 'buy', 'write', 'plan')
+    tags  = ('projects.work.a', 'projects.work.b', 'projects.home', 'home', 'errand', 'read')
+
+    now   = datetime.datetime.now(datetime.timezone.utc)
+
+    tasks = []
+    for i in range(count):
+        t = StandaloneTask()
+        t.id       = i
+        t.text     = ' '.join(rng.choice(words) for j in range(rng.randrange(2, 8)))
+        for j in range(rng.randrange(3)):
+            t.tags.add(rng.choice(tags))
+        t.blocked  = rng.random() < 0.2
+        t.blocking = rng.random() < 0.1
+        t.urgency  = rng.uniform(-5.0, 20.0)
+        t.date_created = now - datetime.timedelta(seconds = rng.randrange(86400 * 1000))
+        if rng.random() < 0.3:
+            t.date_due = now + datetime.timedelta(seconds = rng.randrange(-86400 * 100, 86400 * 100))
+        tasks.append(t)
+    return tasks
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = 'bench.filter')
+    parser.add_argument('-n', '--tasks', type = int, default = 100000,
+                        help = 'Number of tasks to filter')
+    parser.add_argument('-r', '--repeat', type = int, default = 5,
+                        help = 'Number of passes over the tasks')
+    parser.add_argument('filter', nargs = '*', default = DEFAULT_FILTER.split(),
+                        help = 'The filter expression')
+    args = parser.parse_args(argv[1:])
+
+    tasks = make_tasks(args.tasks)
+    f     = task_filter.TaskFilter(args.filter)
+
+    results = {}
+    for name, match in (('interpreted', f._parse_tree.task_match),
+                        ('compiled',    f.matcher())):
+        with common.Timer() as timer:
+            for i in range(args.repeat):
+                results[name] = [t for t in tasks if match(t)]
+        sys.stdout.write('%-11s: %8.3f s, %6.3f us per task\n' %
+                         (name, timer.elapsed, timer.elapsed * 1e6 / (args.tasks * args.repeat)))
+
+    sys.stdout.write('%d tasks matched\n' % len(results['compiled']))
+    if results['interpreted'] != results['compiled']:
+        sys.stdout.write('MISMATCH between the results\n')
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,316 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Generate td repositories of a given size and shape for benchmarking, e.g.
+    python3 -m bench.gen -n 100000 --completed 0.8 /tmp/td-100k
+
+The tasks are created over a period of time ending now and the repository is
+built through Repository.modify(), with a git history of the given number of
+commits: every commit adds the tasks created in its part of the period and
+completes the earlier tasks finished in it.
+
+Every task is generated from its own seeded random generator, so the same
+parameters always give the same tasks (up to the commit dates) and a task can
+be generated again when it is completed, without keeping all the tasks in
+memory.
+"""
+
+import argparse
+import datetime
+import json
+import random
+import sys
+import uuid
+
+from tdlib.repo                import repository
+from tdlib.repo.repository_mod import TaskWrite
+from tdlib.repo.task           import StandaloneTask
+
+from . import common
+
+_WORDS = ('report', 'email', 'fix', 'review', 'call', 'buy', 'write', 'plan',
+          'meeting', 'invoice', 'draft', 'update', 'release', 'backup', 'read',
+          'paper', 'garden', 'car', 'tax', 'doctor', 'server', 'budget', 'book',
+          'trip', 'clean', 'order', 'test', 'deploy', 'document', 'schedule')
+
+_TAG_ROOTS = ('projects', 'areas', 'contexts', 'people')
+
+"""the default generation parameters, see add_arguments() for their meaning"""
+DEFAULTS = {
+    'tasks'          : 10000,
+    'completed'      : 0.5,
+    'tag_depth'      : 3,
+    'tag_fanout'     : 5,
+    'tags_max'       : 3,
+    'dep_density'    : 0.1,
+    'due'            : 0.3,
+    'scheduled'      : 0.1,
+    'span'           : 365,
+    'commits'        : 20,
+    'seed'           : 0,
+}
+
+def add_arguments(parser):
+    """
+    Add the generation parameters to an argparse parser.
+    """
+    d = DEFAULTS
+    parser.add_argument('-n', '--tasks', type = int, default = d['tasks'],
+                        help = 'Total number of tasks')
+    parser.add_argument('--completed', type = float, default = d['completed'],
+                        help = 'Fraction of the tasks that are completed')
+    parser.add_argument('--tag-depth', type = int, default = d['tag_depth'],
+                        help = 'Maximum number of components of a tag')
+    parser.add_argument('--tag-fanout', type = int, default = d['tag_fanout'],
+                        help = 'Number of distinct children of every tag component')
+    parser.add_argument('--tags-max', type = int, default = d['tags_max'],
+                        help = 'Maximum number of tags of a task')
+    parser.add_argument('--dep-density', type = float, default = d['dep_density'],
+                        help = 'Fraction of the tasks depending on other tasks')
+    parser.add_argument('--due', type = float, default = d['due'],
+                        help = 'Fraction of the tasks with a due date')
+    parser.add_argument('--scheduled', type = float, default = d['scheduled'],
+                        help = 'Fraction of the tasks with a scheduled date')
+    parser.add_argument('--span', type = int, default = d['span'],
+                        help = 'Number of days over which the tasks are created')
+    parser.add_argument('--commits', type = int, default = d['commits'],
+                        help = 'Number of commits in the generated history')
+    parser.add_argument('--seed', type = int, default = d['seed'],
+                        help = 'Seed of the random generator')
+
+def params_from_args(args):
+    """
+    Get the dict of generation parameters from parsed arguments.
+    """
+    return { key : getattr(args, key) for key in DEFAULTS }
+
+class _Generator:
+    """
+    Generates the tasks for the given parameters. The tasks are numbered in
+    the order of their creation.
+    """
+
+    ### private ###
+    _params  = None
+    _now     = None
+
+    """the creation time of every task, as seconds before now"""
+    _age     = None
+
+    def __init__(self, params, now):
+        self._params = params
+        self._now    = now
+
+        rng  = random.Random(params['seed'])
+        span = params['span'] * 86400
+        self._age = sorted((rng.uniform(0, span) for i in range(params['tasks'])),
+                           reverse = True)
+
+    def _rng(self, i):
+        return random.Random('%d:%d' % (self._params['seed'], i))
+
+    def age(self, i):
+        """
+        Get the number of seconds between the creation of task i and now.
+        """
+        return self._age[i]
+
+    def created(self, i):
+        return self._now - datetime.timedelta(seconds = self._age[i])
+
+    def task_uuid(self, i):
+        return str(uuid.UUID(int = self._rng(i).getrandbits(128), version = 4))
+
+    def _tag(self, rng):
+        p     = self._params
+        depth = rng.randint(1, max(p['tag_depth'], 1))
+        comps = [rng.choice(_TAG_ROOTS)]
+        for level in range(1, depth):
+            # skewed towards the first children, so that some subtrees are
+            # much larger than others
+            comps.append('%s%d' % (comps[-1][0], int(rng.paretovariate(1.2)) % p['tag_fanout']))
+        return '.'.join(comps)
+
+    def completion(self, i):
+        """
+        Get the completion time of task i, None if it stays pending.
+        """
+        rng = self._rng(i)
+        # skip the values used by task()
+        rng.getrandbits(128)
+        if rng.random() >= self._params['completed']:
+            return None
+
+        # most tasks are completed soon, some take a long time
+        done = self.created(i) + datetime.timedelta(seconds = rng.expovariate(1.0 / (7 * 86400)))
+        return min(done, self._now)
+
+    def task(self, i):
+        """
+        Generate task i, pending.
+        """
+        p   = self._params
+        rng = self._rng(i)
+
+        t = StandaloneTask()
+        t.uuid = str(uuid.UUID(int = rng.getrandbits(128), version = 4))
+        # consumed by completion()
+        rng.random()
+
+        t.text         = ' '.join(rng.choice(_WORDS) for j in range(rng.randint(2, 10)))
+        t.date_created = self.created(i)
+
+        for j in range(rng.randint(0, p['tags_max'])):
+            t.tags.add(self._tag(rng))
+
+        # due dates mostly in the few weeks after creation, so that tasks
+        # created recently are due in the future and older ones are overdue
+        if rng.random() < p['due']:
+            t.date_due = t.date_created + datetime.timedelta(seconds = rng.gauss(14, 10) * 86400)
+        if rng.random() < p['scheduled']:
+            t.date_scheduled = t.date_created + datetime.timedelta(seconds = rng.uniform(0, 30) * 86400)
+
+        # depend on tasks created shortly before, as tasks of one project are
+        if i > 0 and rng.random() < p['dep_density']:
+            for j in range(rng.randint(1, 3)):
+                dep = max(0, i - 1 - int(rng.expovariate(0.01)))
+                t.dependencies.add(self.task_uuid(dep))
+
+        return t
+
+def generate(path, params = None, progress = None):
+    """
+    Create a new td repository at path, filled with tasks generated according
+    to params (a dict overriding DEFAULTS). progress, if not None, is called
+    with a message after every commit.
+
+    Return a Repository for it.
+    """
+    p = dict(DEFAULTS)
+    if params is not None:
+        p.update(params)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    gen = _Generator(p, now)
+
+    repository.init(path)
+
+    conf = common.config_make(path)
+    repo = repository.Repository(path, conf['lib'])
+
+    ntasks  = p['tasks']
+    commits = max(1, p['commits'])
+
+    # the completions falling into the time range of every commit
+    done_in = [[] for c in range(commits)]
+    # end of the time range of commit c, as seconds before now
+    bounds  = [p['span'] * 86400 * (1.0 - (c + 1) / commits) for c in range(commits)]
+
+    def commit_of(t):
+        age = (now - t).total_seconds()
+        for c in range(commits):
+            if age >= bounds[c]:
+                return c
+        return commits - 1
+
+    start = 0
+    for c in range(commits):
+        end = start
+        while end < ntasks and (gen.age(end) >= bounds[c] or c == commits - 1):
+            end += 1
+
+        # tasks completed in the same commit are written completed directly
+        for i in range(start, end):
+            completion = gen.completion(i)
+            if completion is not None:
+                done_in[max(c, commit_of(completion))].append((i, completion))
+        done = { i : completion for i, completion in done_in[c] }
+
+        mod_list = []
+        for i in range(start, end):
+            if not i in done:
+                mod_list.append(TaskWrite(gen.task(i)))
+        for i, completion in done.items():
+            t = gen.task(i)
+            t.completed      = True
+            t.date_completed = completion
+            mod_list.append(TaskWrite(t))
+
+        if mod_list:
+            repo.load().modify(mod_list, 'bench: add %d, complete %d tasks' %
+                               (end - start, len(done)))
+        if progress is not None:
+            progress('commit %d/%d: %d tasks' % (c + 1, commits, end))
+
+        done_in[c] = None
+        start      = end
+
+    return repo
+
+def tw_lines(count, seed = 0):
+    """
+    Generate count tasks in the Taskwarrior export format, one JSON object per
+    line, for the import_tw command.
+    """
+    rng = random.Random('tw:%d' % seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    def tw_date(d):
+        return d.strftime('%Y%m%dT%H%M%SZ')
+
+    uuids = []
+    for i in range(count):
+        task_uuid = str(uuid.UUID(int = rng.getrandbits(128), version = 4))
+        entry     = now - datetime.timedelta(seconds = rng.uniform(0, 365 * 86400))
+
+        task = {
+            'uuid'        : task_uuid,
+            'description' : ' '.join(rng.choice(_WORDS) for j in range(rng.randint(2, 10))),
+            'entry'       : tw_date(entry),
+            'status'      : 'pending',
+        }
+        if rng.random() < 0.5:
+            task['status'] = 'completed'
+            task['end']    = tw_date(entry + datetime.timedelta(days = rng.randint(0, 30)))
+        if rng.random() < 0.3:
+            task['due'] = tw_date(entry + datetime.timedelta(days = rng.randint(0, 30)))
+        if rng.random() < 0.5:
+            task['project'] = rng.choice(_WORDS)
+        if rng.random() < 0.5:
+            task['tags'] = sorted(set(rng.choice(_WORDS) for j in range(rng.randint(1, 3))))
+        if uuids and rng.random() < 0.1:
+            task['depends'] = ','.join(set(rng.choice(uuids[-100:]) for j in range(rng.randint(1, 3))))
+        if rng.random() < 0.1:
+            task['annotations'] = [{ 'entry' : tw_date(entry), 'description' : 'note %d' % i }]
+
+        uuids.append(task_uuid)
+        yield json.dumps(task) + '\n'
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = 'bench.gen')
+    add_arguments(parser)
+    parser.add_argument('path', help = 'Path of the repository to create, must not exist')
+    args = parser.parse_args(argv[1:])
+
+    def progress(msg):
+        sys.stderr.write(msg + '\n')
+
+    with common.Timer() as timer:
+        generate(args.path, params_from_args(args), progress)
+    sys.stdout.write('generated %d tasks in %.3f s\n' % (args.tasks, timer.elapsed))
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
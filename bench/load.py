@@ -0,0 +1,78 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time a cold load of all the pending tasks -- without the snapshot -- and the
+computation of their urgency, with different numbers of loader processes.
+"""
+
+import argparse
+import datetime
+import os
+import os.path
+import sys
+
+from tdlib.repo                import repository, snapshot
+from tdlib.repo.repository_mod import TaskWrite
+from tdlib.repo.task           import StandaloneTask
+
+from . import common
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = 'bench.load')
+    parser.add_argument('-n', '--tasks', type = int, default = 50000,
+                        help = 'Number of pending tasks')
+    parser.add_argument('-w', '--workers', type = int, nargs = '+', default = [1, 2, 4, 8],
+                        help = 'Numbers of loader processes to try')
+    parser.add_argument('-r', '--repeat', type = int, default = 3,
+                        help = 'Number of loads for each number of processes, the best one is reported')
+    args = parser.parse_args(argv[1:])
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    with common.temp_repo() as (repo, conf):
+        mod_list = []
+        for i in range(args.tasks):
+            t = StandaloneTask()
+            t.text         = 'Benchmark task %d' % i
+            t.date_created = now - datetime.timedelta(minutes = i)
+            t.tags.add('bench.t%d' % (i % 10))
+            if i % 7 == 0:
+                t.date_due = now + datetime.timedelta(hours = i % 500)
+            mod_list.append(TaskWrite(t))
+        repo.load().modify(mod_list, 'add')
+
+        snapshot_path = os.path.join(repo.path, '.git', snapshot.SNAPSHOT_NAME)
+
+        for workers in args.workers:
+            conf['lib']['load.workers'] = workers
+
+            best = None
+            for i in range(args.repeat):
+                if os.path.exists(snapshot_path):
+                    os.remove(snapshot_path)
+
+                with common.Timer() as timer:
+                    state = repository.Repository(repo.path, conf['lib']).load()
+                    for t in state.tasks_filter([]):
+                        t.urgency
+                best = timer.elapsed if best is None else min(best, timer.elapsed)
+
+            sys.stdout.write('%d workers: %.3f s\n' % (workers, best))
+
+    sys.stdout.write('%d CPUs available\n' % (os.cpu_count() or 1))
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,64 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time Repository.modify() on large batches: adding N new tasks in one
+modification, then completing all of them in another one.
+"""
+
+import argparse
+import datetime
+import sys
+
+from tdlib.repo.repository_mod import TaskWrite
+from tdlib.repo.task           import StandaloneTask
+
+from . import common
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = 'bench.modify')
+    parser.add_argument('-n', '--tasks', type = int, default = 10000,
+                        help = 'Number of tasks in the batch')
+    args = parser.parse_args(argv[1:])
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    with common.temp_repo() as (repo, conf):
+        mod_list = []
+        for i in range(args.tasks):
+            t = StandaloneTask()
+            t.text         = 'Benchmark task %d' % i
+            t.date_created = now
+            t.tags.add('bench.t%d' % (i % 10))
+            mod_list.append(TaskWrite(t))
+
+        with common.Timer() as timer:
+            repo.load().modify(mod_list, 'add')
+        sys.stdout.write('add %d tasks:  %.3f s\n' % (args.tasks, timer.elapsed))
+
+        state = repo.load()
+        mod_list = []
+        for t in state.tasks_filter([]):
+            t = StandaloneTask(parent = t)
+            t.completed      = True
+            t.date_completed = now
+            mod_list.append(TaskWrite(t))
+
+        with common.Timer() as timer:
+            state.modify(mod_list, 'done')
+        sys.stdout.write('done %d tasks: %.3f s\n' % (args.tasks, timer.elapsed))
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
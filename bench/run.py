@@ -0,0 +1,346 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Run a set of benchmarks on a generated repository and write the results as
+JSON, so that runs on different commits can be compared, e.g.
+    python3 -m bench.run -n 100000 -o before.json
+    ...
+    python3 -m bench.run -n 100000 -o after.json
+    python3 -m bench.compare before.json after.json
+
+The repository is generated by bench.gen into a temporary directory, or an
+existing one is used with --repo. The benchmarks modifying the repository
+run on a copy of it made for every run.
+
+Every benchmark is run a number of times, all the times are recorded and the
+best one is used for comparisons.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import os.path
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from tdlib                     import commands
+from tdlib.repo                import repository, snapshot
+from tdlib.repo.repository_mod import TaskWrite
+from tdlib.repo.task           import StandaloneTask
+
+from . import common, gen
+
+# bump whenever the layout of the results changes
+RESULTS_VERSION = 1
+
+_TD_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'td')
+
+@contextlib.contextmanager
+def _redirect(stdin = None):
+    """
+    Run a command with its output discarded and the given text as its input.
+    """
+    stdin_saved, stdout_saved = sys.stdin, sys.stdout
+    sys.stdin  = io.StringIO(stdin or '')
+    sys.stdout = io.StringIO()
+    try:
+        yield
+    finally:
+        sys.stdin, sys.stdout = stdin_saved, stdout_saved
+
+class _Context:
+    """
+    The state shared by the benchmarks.
+    """
+    args        = None
+    conf        = None
+    path        = None
+    tmpdir      = None
+
+    """path to a config file for the repository, for running td itself"""
+    config_path = None
+
+    """the UUIDs and short IDs of some pending tasks, in random order"""
+    uuids       = None
+    ids         = None
+
+    def repo(self, path = None):
+        return repository.Repository(path or self.path, self.conf['lib'])
+
+    def command(self, argv, path = None, stdin = None):
+        """
+        Run a td command in-process on the repository, with its output
+        discarded.
+        """
+        parser, cmds = commands.parser_create(self.conf, 'td', argv[:1])
+        args = parser.parse_args(argv)
+        with _redirect(stdin):
+            args.execute(self.conf, args, self.repo(path))
+
+    @contextlib.contextmanager
+    def copy(self):
+        """
+        Yield the path of a copy of the repository, removed afterwards.
+        """
+        path = os.path.join(self.tmpdir, 'copy')
+        shutil.copytree(self.path, path, symlinks = True)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path)
+
+def _load(ctx):
+    state = ctx.repo().load()
+    for t in state.tasks_filter([]):
+        t.urgency
+
+def bench_load_cold(ctx, timer):
+    """Load the pending tasks without the snapshot and compute their urgency."""
+    snapshot_path = os.path.join(ctx.path, '.git', snapshot.SNAPSHOT_NAME)
+    if os.path.exists(snapshot_path):
+        os.remove(snapshot_path)
+
+    with timer:
+        _load(ctx)
+
+def bench_load_warm(ctx, timer):
+    """Load the pending tasks from the snapshot and compute their urgency."""
+    _load(ctx)
+
+    with timer:
+        _load(ctx)
+
+def bench_report(ctx, timer):
+    """Render the 'next' report (without the report cache)."""
+    with timer:
+        ctx.command(['next'])
+
+def bench_report_all(ctx, timer):
+    """Render the 'list' report with all the pending tasks."""
+    with timer:
+        ctx.command(['list'])
+
+def bench_lookup(ctx, timer):
+    """Look up tasks by short ID and by UUID on a loaded state."""
+    state = ctx.repo().load()
+
+    with timer:
+        for task_id, task_uuid in zip(ctx.ids, ctx.uuids):
+            state.tasks_filter(['id:%d' % task_id])
+            state.tasks_filter(['uuid:%s' % task_uuid])
+
+def bench_filter_text(ctx, timer):
+    """Search the text of the pending tasks."""
+    state = ctx.repo().load()
+
+    with timer:
+        state.tasks_filter(['text:report', 'and', 'not', 'text:email'])
+
+def bench_done_bulk(ctx, timer):
+    """Complete a batch of pending tasks in one modification."""
+    with ctx.copy() as path:
+        with timer:
+            state = ctx.repo(path).load()
+            now   = datetime.datetime.now(datetime.timezone.utc)
+
+            mod_list = []
+            for task_uuid in ctx.uuids:
+                t = StandaloneTask(parent = state.tasks_filter(['uuid:%s' % task_uuid])[0])
+                t.completed      = True
+                t.date_completed = now
+                mod_list.append(TaskWrite(t))
+            state.modify(mod_list, 'done')
+
+def bench_modify_bulk(ctx, timer):
+    """Add a tag and a due date to a batch of pending tasks in one modification."""
+    with ctx.copy() as path:
+        with timer:
+            state = ctx.repo(path).load()
+            due   = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days = 3)
+
+            mod_list = []
+            for task_uuid in ctx.uuids:
+                t = StandaloneTask(parent = state.tasks_filter(['uuid:%s' % task_uuid])[0])
+                t.tags.add('bench.modified')
+                t.date_due = due
+                mod_list.append(TaskWrite(t))
+            state.modify(mod_list, 'modify')
+
+def bench_import_tw(ctx, timer):
+    """Import tasks exported from Taskwarrior."""
+    data = ''.join(gen.tw_lines(ctx.args.import_tasks, ctx.args.seed))
+
+    with ctx.copy() as path:
+        with timer:
+            ctx.command(['import_tw'], path = path, stdin = data)
+
+def bench_cli(ctx, timer):
+    """Run 'td next' as a new process, including the interpreter startup."""
+    with timer:
+        subprocess.run([sys.executable, _TD_PATH, '-c', ctx.config_path, 'next'],
+                       stdout = subprocess.DEVNULL, check = True)
+
+"""the benchmarks, in the order they are run"""
+BENCHMARKS = {
+    'load_cold'   : bench_load_cold,
+    'load_warm'   : bench_load_warm,
+    'report'      : bench_report,
+    'report_all'  : bench_report_all,
+    'lookup'      : bench_lookup,
+    'filter_text' : bench_filter_text,
+    'done_bulk'   : bench_done_bulk,
+    'modify_bulk' : bench_modify_bulk,
+    'import_tw'   : bench_import_tw,
+    'cli'         : bench_cli,
+}
+
+def _source_commit():
+    """
+    Get the commit of the td source tree being benchmarked, with '-dirty'
+    appended if it has uncommitted changes. None if it is not known.
+    """
+    srcdir = os.path.dirname(_TD_PATH)
+    try:
+        head  = subprocess.run(['git', '-C', srcdir, 'rev-parse', 'HEAD'], check = True,
+                               stdout = subprocess.PIPE, stderr = subprocess.DEVNULL,
+                               universal_newlines = True).stdout.strip()
+        dirty = subprocess.run(['git', '-C', srcdir, 'status', '--porcelain', '--untracked-files=no'],
+                               check = True, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL,
+                               universal_newlines = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return head + '-dirty' if dirty else head
+
+def _run(ctx, names, repeat, progress):
+    results = {}
+    for name in names:
+        runs = []
+        for i in range(repeat):
+            timer = common.Timer()
+            BENCHMARKS[name](ctx, timer)
+            runs.append(timer.elapsed)
+
+        results[name] = {
+            'description' : BENCHMARKS[name].__doc__,
+            'runs'        : runs,
+            'best'        : min(runs),
+        }
+        progress('%-12s %.3f s' % (name, min(runs)))
+
+    return results
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = 'bench.run')
+    gen.add_arguments(parser)
+    parser.add_argument('--repo',
+                        help = 'Use the existing repository at this path instead of generating one; '
+                        'the generation parameters are then only recorded in the results')
+    parser.add_argument('-b', '--bench', nargs = '+', choices = list(BENCHMARKS),
+                        default = list(BENCHMARKS),
+                        help = 'Benchmarks to run')
+    parser.add_argument('-r', '--repeat', type = int, default = 3,
+                        help = 'Number of runs of every benchmark')
+    parser.add_argument('--batch', type = int, default = 1000,
+                        help = 'Number of tasks looked up, completed or modified by the batch benchmarks')
+    parser.add_argument('--import-tasks', type = int, default = 1000,
+                        help = 'Number of tasks imported from Taskwarrior')
+    parser.add_argument('-o', '--output',
+                        help = 'Write the results to this file instead of the standard output')
+    args = parser.parse_args(argv[1:])
+
+    def progress(msg):
+        sys.stderr.write(msg + '\n')
+
+    ctx        = _Context()
+    ctx.args   = args
+    ctx.tmpdir = tempfile.mkdtemp(prefix = 'td-bench-')
+    try:
+        params = gen.params_from_args(args)
+
+        gen_time = None
+        if args.repo is not None:
+            ctx.path = os.path.abspath(args.repo)
+        else:
+            ctx.path = os.path.join(ctx.tmpdir, 'repo')
+            with common.Timer() as timer:
+                gen.generate(ctx.path, params, progress)
+            gen_time = timer.elapsed
+
+        # the report cache is disabled, so that the reports are rendered
+        ctx.conf = common.config_make(ctx.path)
+        ctx.conf['report_cache']['enabled'] = False
+
+        ctx.config_path = os.path.join(ctx.tmpdir, 'config')
+        with open(ctx.config_path, 'w') as f:
+            f.write('repo_path=%s\nreport_cache.enabled=false\n' % ctx.path)
+
+        repo = ctx.repo()
+        repo.update_ids()
+
+        state   = repo.load()
+        pending = state.tasks_filter([])
+
+        rng = random.Random(args.seed)
+        sample    = rng.sample(pending, min(args.batch, len(pending)))
+        ctx.uuids = [t.uuid for t in sample]
+        ctx.ids   = [t.id for t in sample]
+
+        repo_info = {
+            'path'    : ctx.path,
+            'pending' : len(pending),
+            'tasks'   : len(os.listdir(os.path.join(ctx.path, 'tasks'))),
+            'commits' : int(subprocess.run(['git', '-C', ctx.path, 'rev-list', '--count', 'HEAD'],
+                                           check = True, stdout = subprocess.PIPE,
+                                           universal_newlines = True).stdout),
+        }
+        del state, pending, sample
+
+        results = _run(ctx, args.bench, args.repeat, progress)
+    finally:
+        shutil.rmtree(ctx.tmpdir)
+
+    report = {
+        'version'   : RESULTS_VERSION,
+        'commit'    : _source_commit(),
+        'date'      : datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python'    : platform.python_version(),
+        'machine'   : platform.machine(),
+        'cpus'      : os.cpu_count(),
+        'params'    : dict(params, repeat = args.repeat, batch = args.batch,
+                           import_tasks = args.import_tasks),
+        'generated' : args.repo is None,
+        'gen_time'  : gen_time,
+        'repo'      : repo_info,
+        'results'   : results,
+    }
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent = 4)
+            f.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent = 4)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,100 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare computing the urgency of in-memory tasks one by one with the batch
+computation (vectorized with NumPy, if available).
+"""
+
+import argparse
+import datetime
+import random
+import sys
+
+from tdlib            import config
+from tdlib.repo       import index, urgency
+from tdlib.repo.task  import StandaloneTask, _Dependencies
+
+from . import common
+
+def make_tasks(count, seed = 0):
+    """
+    Create count in-memory pending tasks with the fields used by the urgency
+    computation set, as a dict of { uuid : task }.
+    """
+    rng  = random.Random(seed)
+    tags = ('projects.work.a', 'projects.work.b', 'projects.home', 'home', 'errand', 'read')
+    now  = datetime.datetime.now(datetime.timezone.utc)
+
+    tasks = {}
+    for i in range(count):
+        t = StandaloneTask()
+        for j in range(rng.randrange(3)):
+            t.tags.add(rng.choice(tags))
+
+        t.dependents = _Dependencies()
+        if rng.random() < 0.1:
+            for j in range(rng.randrange(1, 5)):
+                t.dependents.add(str(StandaloneTask().uuid))
+        t.blocked  = rng.random() < 0.2
+
+        if rng.random() < 0.2:
+            t.date_scheduled = now + datetime.timedelta(seconds = rng.randrange(-86400 * 3, 86400 * 3))
+        if rng.random() < 0.3:
+            t.date_due       = now + datetime.timedelta(seconds = rng.randrange(-86400 * 30, 86400 * 30))
+
+        tasks[t.uuid] = t
+    return tasks
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = 'bench.urgency')
+    parser.add_argument('-n', '--tasks', type = int, default = 100000,
+                        help = 'Number of tasks')
+    parser.add_argument('-r', '--repeat', type = int, default = 5,
+                        help = 'Number of evaluations')
+    args = parser.parse_args(argv[1:])
+
+    conf = config.Config()
+    conf['lib.urgency.factors.tags.projects.work'] = '2.0'
+    conf['lib.urgency.factors.tags.home']          = '-1.0'
+    conf['lib.urgency.factors.tags.read']          = '0.5'
+
+    urgency.numpy_import()
+
+    tasks  = make_tasks(args.tasks)
+    idx    = index.TaskIndex(tasks, {})
+    engine = urgency.UrgencyEngine(conf['lib']['urgency.factors'])
+    now    = datetime.datetime.now(datetime.timezone.utc)
+
+    task_list = list(tasks.values())
+    # build the tag index outside of the timed part
+    idx.lookup_tags(('home',))
+
+    results = {}
+    for name, compute in (('per task', lambda: [engine.task_urgency(t, idx, now) for t in task_list]),
+                          ('batch',    lambda: engine.tasks_urgency(task_list, idx, now))):
+        with common.Timer() as timer:
+            for i in range(args.repeat):
+                results[name] = compute()
+        sys.stdout.write('%-8s: %8.3f s, %6.3f us per task\n' %
+                         (name, timer.elapsed, timer.elapsed * 1e6 / (args.tasks * args.repeat)))
+
+    sys.stdout.write('NumPy %s\n' % ('available' if urgency.numpy_get() is not None else 'not available'))
+    if results['per task'] != results['batch']:
+        sys.stdout.write('MISMATCH between the results\n')
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -13,24 +13,107 @@
 # You should have received a copy of the GNU General Public License along
 # with td. If not, see <http://www.gnu.org/licenses/>.
 
-from . import add
-from . import delete
-from . import done
-from . import import_tw
-from . import init
-from . import modify
-from . import report
-from . import show
-from . import tags
-
-commands = {
-    'add'       : add.cmd,
-    'delete'    : delete.cmd,
-    'done'      : done.cmd,
-    'import_tw' : import_tw.cmd,
-    'init'      : init.cmd,
-    'modify'    : modify.cmd,
-    'report'    : report.cmd,
-    'show'      : show.cmd,
-    'tags'      : tags.cmd
-}
+import argparse
+import importlib
+
+"""
+The modules implementing the commands, in the order they are listed in the
+help. They are only imported when one of their commands is run.
+"""
+command_modules = ('add', 'daemon', 'delete', 'done', 'import_tw', 'init',
+                   'modify', 'report', 'show', 'tags')
+
+class FilterAction(argparse.Action):
+    """
+    The action of a positional taking the filter words of a command, with
+    nargs = argparse.REMAINDER. Left to argparse, the remainder swallows
+    everything following the first filter word, so the options of the
+    command given after the filter, as in 'td list +work --limit 5', would be
+    taken as filter words.
+
+    Those options are parsed as such here. A '--' ends the options, the words
+    following it are always taken as filter words, e.g. to search for a text
+    starting with '-'.
+    """
+    def _is_option(self, parser, word):
+        if not word.startswith('-') or word == '-':
+            return False
+
+        opt = word.partition('=')[0]
+        if opt in parser._option_string_actions:
+            return True
+
+        # a short option with its value attached, e.g. -l5
+        return (not word.startswith('--') and
+                word[:2] in parser._option_string_actions)
+
+    def __call__(self, parser, namespace, values, option_string = None):
+        words = []
+        for i, word in enumerate(values):
+            if word == '--':
+                words.extend(values[i + 1:])
+                break
+
+            if self._is_option(parser, word):
+                # parse the rest of the command line again, the remaining
+                # filter words are collected through this action
+                parser.parse_args(values[i:], namespace)
+                words.extend(getattr(namespace, self.dest))
+                break
+
+            words.append(word)
+
+        setattr(namespace, self.dest, words)
+
+def _module_commands(conf, module):
+    """
+    Get the names of the (sub)commands defined by the given module.
+    """
+    # one command per report defined in the config
+    if module == 'report':
+        return list(conf['reports'])
+    return [module]
+
+def parser_create(conf, prog, names = None):
+    """
+    Create the command line parser. If names is not None, only the modules
+    implementing the commands with those names are imported and only their
+    parsers are fully set up; the other commands are registered by name.
+    Otherwise all the command modules are imported.
+
+    Return the parser and a dict of { command name : cmd dict } for the
+    commands whose modules were imported.
+    """
+    parser = argparse.ArgumentParser(prog = prog)
+
+    parser.add_argument('-c', '--config', help = 'Path to the config file.')
+    parser.add_argument('--paranoid', action = 'store_true',
+                        help = 'Always scan the whole repository working tree for changes '
+                        'not made by td, instead of trusting the state recorded by td.')
+    parser.add_argument('--profile', action = 'store_true',
+                        help = 'Print the time spent in the phases of the command to the standard error.')
+    parser.add_argument('--profile-json', metavar = 'FILE',
+                        help = 'Write the time spent in the phases of the command as JSON to FILE, '
+                        '- for the standard error.')
+    parser.add_argument('--profile-dump', metavar = 'FILE',
+                        help = 'Profile the command with cProfile and write the statistics to FILE.')
+
+    parser.set_defaults(execute = lambda conf, args, repo, parser = parser: parser.print_usage())
+
+    cmds = {}
+
+    subparsers = parser.add_subparsers(dest = 'parser')
+    for module in command_modules:
+        module_names = _module_commands(conf, module)
+
+        if names is not None and not set(module_names) & set(names):
+            for name in module_names:
+                subparsers.add_parser(name, add_help = False)
+            continue
+
+        cmd_dict = importlib.import_module('.' + module, __name__).cmd
+        cmd_dict['init_parser'](conf, subparsers)
+        for name in module_names:
+            cmds[name] = cmd_dict
+
+    return parser, cmds
@@ -17,7 +17,6 @@ import argparse
 import datetime
 import sys
 
-from ..repo.repository     import Repository
 from ..repo.repository_mod import TaskWrite
 from ..repo.task           import StandaloneTask, TaskModification
 
@@ -55,4 +54,5 @@ def add_init_parser(config, subparsers):
 cmd = {
     'init_parser' : add_init_parser,
     'open_repo'   : True,
+    'daemon'      : True,
 }
@@ -43,5 +43,6 @@ def init_parser(config, subparsers):
 cmd = {
     'init_parser' : init_parser,
     'open_repo'   : True,
+    'daemon'      : True,
 }
 
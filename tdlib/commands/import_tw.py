@@ -14,12 +14,12 @@
 # with td. If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
-import dateutil.parser
 import json
 import sys
 
 from ..repo.repository_mod import TaskWrite
 from ..repo.task           import StandaloneTask
+from ..utils               import dates
 
 def cmd_execute(conf, args, repo):
     repo_state = repo.load()
@@ -51,13 +51,13 @@ def cmd_execute(conf, args, repo):
             elif key == 'uuid':
                 td_task.uuid = val
             elif key == 'entry':
-                td_task.date_created = dateutil.parser.parse(val)
+                td_task.date_created = dates.parse(val)
             elif key == 'end':
-                td_task.date_completed = dateutil.parser.parse(val)
+                td_task.date_completed = dates.parse(val)
             elif key == 'due':
-                td_task.date_due = dateutil.parser.parse(val)
+                td_task.date_due = dates.parse(val)
             elif key == 'scheduled':
-                td_task.date_scheduled = dateutil.parser.parse(val)
+                td_task.date_scheduled = dates.parse(val)
             elif key == 'tags':
                 for tag in val:
                     td_task.tags.add(tag)
@@ -50,4 +50,5 @@ def init_parser(config, subparsers):
 cmd = {
     'init_parser' : init_parser,
     'open_repo'   : True,
+    'daemon'      : True,
 }
@@ -14,32 +14,102 @@
 # with td. If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
+import os
 import sys
+import time
 
-from ..repo.repository import Repository
-from ..utils import report_print
+from .       import FilterAction
+from ..config import parse_bool
+from ..repo   import stamp
+from ..utils  import profiling, report_cache, task_output
 
-def _cmd_execute(conf, args, repo, report):
-    repo.update_ids()
+def _cache_key(conf, args, repo_path, repo_stamp, report, limit):
+    """
+    Get the key of the cached output of the report on the repository state
+    identified by repo_stamp, None if it must not be cached.
+    """
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, ValueError, OSError):
+        return None
 
-    repo_state = repo.load()
+    tty   = os.isatty(fd)
+    width = os.get_terminal_size(fd).columns if tty else None
 
+    return report_cache.key_make(repo_stamp, os.path.abspath(repo_path), repr(conf),
+                                 report, args.filter, limit, tty, width, os.environ.get('TERM'))
+
+def _cmd_execute(conf, args, repo, report):
     rc = conf['reports'][report]
 
     columns = [('id', 'ID'), ('tags', 'Tags'), ('urgency', 'Urgency'), ('text', 'Description')]
 
-    if len(rc['filter']) > 0 and len(args.filter) > 0:
-        filter = ['('] + args.filter + [')', 'and', '('] + rc['filter'].split() + [')']
-    elif len(rc['filter']) > 0:
-        filter = rc['filter'].split()
+    if len(rc.filter) > 0 and len(args.filter) > 0:
+        filter = ['('] + args.filter + [')', 'and', '('] + rc.filter.split() + [')']
+    elif len(rc.filter) > 0:
+        filter = rc.filter.split()
     elif len(args.filter) > 0:
         filter = args.filter
     else:
         filter = ''
 
-    tasks = list(repo_state.tasks_filter(filter))
+    limit = args.limit if args.limit is not None else int(rc.limit)
+    if limit <= 0:
+        limit = None
+
+    # only the table output is cached
+    cache = None
+    key   = None
+    cc    = conf.report_cache
+    if args.format == 'table' and not args.paranoid and parse_bool(cc.enabled):
+        cache = report_cache.ReportCache(cc.path, int(cc.max_age), int(cc.max_size))
+
+        with profiling.span('report_cache'):
+            key    = _cache_key(conf, args, repo.path, stamp.repo_stamp(repo.path),
+                                report, limit)
+            output = cache.lookup(key) if key is not None else None
+        if output is not None:
+            sys.stdout.write(output)
+            return
+
+    ids_changed = repo.update_ids()
+
+    repo_state = repo.load()
+
+    if args.format == 'table':
+        with profiling.span('import'):
+            from ..utils import report_print
+
+        # nothing is stored if the output is outdated right away
+        expiry = None
+        if key is not None:
+            expiry = report_cache.local_midnight()
+            change = repo_state.urgency_next_change()
+            if change is not None:
+                expiry = min(expiry, change.timestamp())
+
+            if expiry <= time.time():
+                key = None
+            elif ids_changed:
+                key = _cache_key(conf, args, repo.path, repo_state.clean_stamp,
+                                 report, limit)
+
+        out = sys.stdout if key is None else report_cache.OutputRecorder(sys.stdout)
+
+        tasks = list(repo_state.tasks_filter(filter))
+        report_print.report_print(conf, out, tasks, columns, rc.sort, ' ',
+                                  limit = limit)
+
+        if key is not None:
+            with profiling.span('report_cache'):
+                cache.store(key, out.getvalue(), expiry)
+        return
+
+    # in the same order as the table
+    tasks = task_output.tasks_sort(repo_state.tasks_filter_iter(filter), rc.sort, limit)
 
-    report_print.report_print(conf, sys.stdout, tasks, columns, rc['sort'], ' ')
+    fields = ['uuid'] + [col for col, label in columns]
+    task_output.tasks_write(sys.stdout, args.format, tasks, fields)
 
 class _ReportExecuteWrapper:
     _report = None
@@ -52,10 +122,15 @@ def init_parser(config, subparsers):
     for report in config['reports']:
         parser = subparsers.add_parser(report)
         parser.set_defaults(execute = _ReportExecuteWrapper(report))
-        parser.add_argument('filter', nargs = argparse.REMAINDER,
-                            help = 'Tasks to show')
+        parser.add_argument('-l', '--limit', type = int,
+                            help = 'Show at most this many tasks, 0 for no limit')
+        parser.add_argument('-f', '--format', choices = task_output.FORMATS, default = 'table',
+                            help = 'Output format; jsonl and tsv are written one task per line')
+        parser.add_argument('filter', nargs = argparse.REMAINDER, action = FilterAction,
+                            help = 'Tasks to show; the options may also follow it')
 
 cmd = {
     'init_parser' : init_parser,
     'open_repo'   : True,
+    'daemon'      : True,
 }
@@ -16,13 +16,26 @@
 import argparse
 import sys
 
-from ..repo.repository import Repository
+from .      import FilterAction
+from ..utils import task_output
+
+"""the task attributes written by the machine-readable formats"""
+_FIELDS = ('uuid', 'id', 'completed', 'blocked', 'text', 'urgency',
+           'date_created', 'date_completed', 'date_due', 'date_scheduled',
+           'tags', 'dependencies', 'dependents')
 
 def cmd_execute(conf, args, repo):
     repo.update_ids()
 
     repo_state = repo.load()
 
+    if args.format != 'table':
+        # the dates are written in UTC and the dependencies as UUIDs, so each
+        # task is written out as soon as it is found
+        task_output.tasks_write(sys.stdout, args.format,
+                                repo_state.tasks_filter_iter(args.filter), _FIELDS)
+        return
+
     for t in repo_state.tasks_filter(args.filter):
         task_formatted = []
 
@@ -111,12 +124,15 @@ def init_parser(config, subparsers):
     parser = subparsers.add_parser('show')
     parser.set_defaults(execute = cmd_execute)
 
-    parser.add_argument('filter', nargs = argparse.REMAINDER,
-                        help = 'Tasks to show')
+    parser.add_argument('-f', '--format', choices = task_output.FORMATS, default = 'table',
+                        help = 'Output format; jsonl and tsv are written one task per line')
+    parser.add_argument('filter', nargs = argparse.REMAINDER, action = FilterAction,
+                        help = 'Tasks to show; the options may also follow it')
 
     return parser
 
 cmd = {
     'init_parser' : init_parser,
     'open_repo'   : True,
+    'daemon'      : True,
 }
@@ -19,6 +19,11 @@ import sys
 def cmd_execute(conf, args, repo):
     repo_state = repo.load()
 
+    if args.counts:
+        for tag, count in repo_state.tags():
+            sys.stdout.write('%s %d\n' % (tag, count))
+        return
+
     tags = set()
     for task in repo_state.tasks_filter([]):
         for tag in task.tags:
@@ -32,9 +37,14 @@ def init_parser(config, subparsers):
     parser = subparsers.add_parser('tags')
     parser.set_defaults(execute = cmd_execute)
 
+    parser.add_argument('-c', '--counts', action = 'store_true',
+                        help = 'Also print the number of pending tasks with every tag or its subtags, '
+                        'including the parent tags no task is tagged with directly')
+
     return parser
 
 cmd = {
     'init_parser' : init_parser,
     'open_repo'   : True,
+    'daemon'      : True,
 }
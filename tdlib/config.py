@@ -13,10 +13,14 @@
 # You should have received a copy of the GNU General Public License along
 # with td. If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
+import os
 import os.path
+import pickle
 import xdg.BaseDirectory
 
-from . import common_defs
+from .       import common_defs
+from .utils import pickle_file
 
 class _ConfigSectionTemplate:
     """A dict/section of defaults used for any child elements"""
@@ -44,6 +48,8 @@ _config_defaults = {
             'filter'      : '',
             'columns'     : 'id ID|tags Tags|urgency Urgency|text Description',
             'sort'        : 'id+',
+            # maximum number of tasks to show, 0 for no limit
+            'limit'       : 0,
         },
         {
             'list.description'  : 'All pending tasks, sorted by short ID.',
@@ -58,9 +64,31 @@ _config_defaults = {
         },
     ),
 
-
+    'report_cache' : {
+        # cache the rendered table output of reports, so that running the
+        # same report again without any changes to the tasks is fast
+        'enabled'  : True,
+        'path'     : os.path.join(xdg.BaseDirectory.xdg_cache_home, common_defs.PROGNAME, 'reports'),
+        # cached entries older than this many seconds are removed
+        'max_age'  : 7 * 86400,
+        # maximum total size of the cached entries in bytes, the oldest
+        # entries are removed when it is exceeded
+        'max_size' : 4 * 1024 * 1024,
+    },
 
     'lib' : {
+        # keep an index of the text of all the tasks in the git directory,
+        # which speeds up text searches in large repositories, at the cost of
+        # building it on first use and keeping it up to date
+        'text_index' : False,
+
+        'load' : {
+            # number of processes reading the task files when many of them
+            # need to be loaded at once (e.g. when the cached snapshot of the
+            # pending tasks is missing); 0 to use all the available CPUs
+            'workers' : 1,
+        },
+
         'urgency' : {
             'factors' : {
                 # the factor for the task with one dependent task
@@ -98,8 +126,58 @@ _config_defaults = {
 class InvalidConfigItem(Exception):
     pass
 
+def parse_bool(val):
+    """
+    Interpret a boolean config item, which is a string if set in the config
+    file.
+    """
+    if isinstance(val, bool):
+        return val
+
+    val = val.strip().lower()
+    if val in ('1', 'true', 'yes', 'on'):
+        return True
+    if val in ('0', 'false', 'no', 'off'):
+        return False
+    raise InvalidConfigItem('Invalid boolean value: %s' % val)
+
+def _convert(key, cur, val):
+    """
+    Convert a value set as a string (e.g. from the config file) to the type
+    of the current (default) value of the item.
+    """
+    if not isinstance(val, str) or cur is None or isinstance(cur, str):
+        return val
+
+    try:
+        if isinstance(cur, bool):
+            return parse_bool(val)
+        if isinstance(cur, int):
+            return int(val)
+        if isinstance(cur, float):
+            return float(val)
+    except ValueError:
+        raise InvalidConfigItem('Invalid value for "%s": %s' % (key, val))
+    return val
+
+class _ReadOnlyDict(dict):
+    """
+    A dict that cannot be modified, for the free-form sections (e.g. the
+    urgency factors of tags) of a read-only config.
+    """
+    def _readonly(self, *args, **kwargs):
+        raise InvalidConfigItem('Attempted to modify a read-only config')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (_ReadOnlyDict, (dict(self),))
+
 class _ConfigSection:
-    _data = None
+    _data   = None
+
+    """the section is read-only, see freeze()"""
+    _frozen = False
 
     def __init__(self, defaults):
         self._data = {}
@@ -131,7 +209,19 @@ class _ConfigSection:
             return val[remainder]
         return val
 
+    def __getattr__(self, name):
+        # only called for the items not set as attributes by freeze()
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
     def __setitem__(self, key, val):
+        if self._frozen:
+            raise InvalidConfigItem('Attempted to set "%s" in a read-only config' % key)
+
         remainder = None
         if '.' in key:
             key, remainder = key.split('.', maxsplit = 1)
@@ -147,7 +237,23 @@ class _ConfigSection:
         else:
             if isinstance(self._data[key], _ConfigSection):
                 raise InvalidConfigItem('Key "%s" refers to a config section, not a single item' % key)
-            self._data[key] = val
+            self._data[key] = _convert(key, self._data[key], val)
+
+    def freeze(self):
+        """
+        Make the section and all its subsections read-only, with the items
+        also available as attributes.
+        """
+        for key, val in self._data.items():
+            if isinstance(val, _ConfigSection):
+                val.freeze()
+            elif isinstance(val, dict):
+                val = self._data[key] = _ReadOnlyDict(val)
+
+            if key.isidentifier() and not key in _section_names:
+                self.__dict__[key] = val
+
+        self._frozen = True
 
     def __iter__(self):
         return iter(self._data)
@@ -163,6 +269,8 @@ class _ConfigSectionTemplated(_ConfigSection):
         self._defaults_template = defaults_template
 
     def __setitem__(self, key, val):
+        if self._frozen:
+            raise InvalidConfigItem('Attempted to set "%s" in a read-only config' % key)
         if not '.' in key:
             raise InvalidConfigItem('Attemted to assign directly to "%s", '
                                     'but "%s" is a templated section' % (key, key))
@@ -175,6 +283,62 @@ class _ConfigSectionTemplated(_ConfigSection):
         else:
             self._data[key][remainder] = val
 
+"""the names of the section methods, which cannot be used for items as attributes"""
+_section_names = frozenset(dir(_ConfigSectionTemplated))
+
 class Config(_ConfigSection):
     def __init__(self):
         super().__init__(_config_defaults)
+
+CONFIG_CACHE_VERSION = 1
+
+def _parse(config_path):
+    conf = Config()
+
+    if config_path != None and os.path.isfile(config_path):
+        with open(config_path, 'r') as cf:
+            for line in cf:
+                line = line.strip()
+                if len(line) == 0 or line.startswith('#'):
+                    continue
+
+                entry, val = line.split('=', maxsplit = 1)
+                conf[entry] = val
+
+    return conf
+
+def load(config_path):
+    """
+    Read the config file at config_path -- which may be None or not exist,
+    in which case the defaults are used -- and return the read-only Config.
+    The parsed config is cached on disk.
+    """
+    try:
+        st = os.stat(config_path)
+    except (OSError, TypeError):
+        conf = Config()
+        conf.freeze()
+        return conf
+
+    path       = os.path.abspath(config_path)
+    stamp      = (path, st.st_ino, st.st_mtime_ns, st.st_size, os.stat(__file__).st_mtime_ns,
+                  xdg.BaseDirectory.xdg_data_home, xdg.BaseDirectory.xdg_cache_home)
+    cache_dir  = os.path.join(xdg.BaseDirectory.xdg_cache_home, common_defs.PROGNAME, 'config')
+    cache_path = os.path.join(cache_dir, hashlib.sha256(path.encode('utf-8')).hexdigest())
+
+    conf = None
+    try:
+        with open(cache_path, 'rb') as f:
+            version, cached_stamp, cached_conf = pickle.load(f)
+        if version == CONFIG_CACHE_VERSION and cached_stamp == stamp:
+            conf = cached_conf
+    except Exception:
+        pass
+
+    if conf is None:
+        conf = _parse(config_path)
+        conf.freeze()
+
+        pickle_file.store(cache_path, (CONFIG_CACHE_VERSION, stamp, conf))
+
+    return conf
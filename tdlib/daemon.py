@@ -0,0 +1,399 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The td daemon, which keeps the state of a task repository loaded and runs
+commands on it for the command line client.
+
+The daemon listens on a Unix socket inside the git directory of the task
+repository. For every command, the client sends a request frame together with
+its stdout and stderr file descriptors, the daemon replies with a frame with
+the exit status, or refuses the request if it was started with a different
+config or environment. A frame is a JSON object encoded in UTF-8, preceded by
+its length as a 32-bit big-endian integer.
+"""
+
+import hashlib
+import json
+import os
+import os.path
+import selectors
+import signal
+import socket
+import struct
+import sys
+import time
+import traceback
+
+from .repo import stamp
+
+PROTOCOL_VERSION = 1
+
+DAEMON_SOCKET_NAME = 'td_daemon.sock'
+
+"""the environment variables that must match between the client and the daemon"""
+_ENV_SHARED = ('TZ', 'TERM')
+
+"""seconds to wait after a change in the repository before reloading"""
+RELOAD_DELAY = 0.1
+
+_frame_header = struct.Struct('>I')
+
+class DaemonError(Exception):
+    pass
+
+def socket_path(repo_path):
+    return os.path.join(repo_path, '.git', DAEMON_SOCKET_NAME)
+
+def _config_hash(conf):
+    return hashlib.sha256(repr(conf).encode('utf-8')).hexdigest()
+
+def _frame_pack(obj):
+    data = json.dumps(obj, ensure_ascii = False).encode('utf-8')
+    return _frame_header.pack(len(data)) + data
+
+def _recv_exact(sock, size, data = b''):
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise DaemonError('Connection closed')
+        data += chunk
+    return data
+
+def _frame_recv(sock, data = b''):
+    """
+    Read one frame from the socket. data contains the bytes of the frame
+    already received.
+    """
+    data   = _recv_exact(sock, _frame_header.size, data)
+    size,  = _frame_header.unpack_from(data)
+    data   = _recv_exact(sock, _frame_header.size + size, data)
+    return json.loads(data[_frame_header.size:].decode('utf-8'))
+
+class _ResidentRepository:
+    """
+    Stands in for the Repository in the commands run by the daemon: the
+    loaded state is handed out again for as long as it is valid.
+    """
+
+    ### public ###
+    """path to the repository root"""
+    path = None
+
+    ### private ###
+    """the underlying Repository"""
+    _repo  = None
+
+    """the loaded state, None if not loaded"""
+    _state = None
+
+    """the stamp of the repository contents the state was loaded from"""
+    _key   = None
+
+    def __init__(self, repo):
+        self.path  = repo.path
+        self._repo = repo
+
+    def _valid(self):
+        return (self._state is not None and not self._state.modified() and
+                stamp.repo_stamp(self.path) == self._key)
+
+    def drop(self):
+        self._state = None
+        self._key   = None
+
+    def load(self):
+        if not self._valid():
+            self.drop()
+
+            key         = stamp.repo_stamp(self.path)
+            self._state = self._repo.load()
+            self._key   = key
+        else:
+            self._state.urgency_refresh()
+
+        return self._state
+
+    def update_ids(self):
+        return self.load().update_ids()
+
+    def warm(self):
+        """
+        Load the state and everything derived from it, so that the next
+        request is fast.
+        """
+        self.load().urgency_next_change()
+
+class Server:
+    """
+    The daemon serving the task repository at repo_path, with the given
+    config.
+    """
+
+    ### private ###
+    _conf        = None
+    _conf_hash   = None
+    _repo        = None
+    _path        = None
+
+    """the command line parser and the cmd dicts of all the commands"""
+    _parser      = None
+    _cmds        = None
+
+    _inotify     = None
+
+    def __init__(self, conf, repo):
+        from . import commands
+
+        self._conf      = conf
+        self._conf_hash = _config_hash(conf)
+        self._repo      = _ResidentRepository(repo)
+        self._path      = socket_path(repo.path)
+
+        self._parser, self._cmds = commands.parser_create(conf, 'td')
+
+    def _inotify_init(self):
+        from .utils import inotify
+
+        try:
+            ino = inotify.Inotify()
+        except OSError:
+            return None
+
+        gitdir = os.path.join(self._repo.path, '.git')
+        for path in (gitdir,
+                     os.path.join(gitdir, 'refs', 'heads'),
+                     self._repo.path,
+                     os.path.join(self._repo.path, 'tasks')):
+            try:
+                ino.watch(path)
+            except OSError:
+                pass
+
+        return ino
+
+    def _events_relevant(self, events):
+        gitdir = os.path.join(self._repo.path, '.git')
+
+        relevant = False
+        for path, mask, name in events:
+            if path is None:
+                # queue overflow
+                relevant = True
+            elif path == gitdir:
+                # ignore the files td itself keeps there
+                if name in ('HEAD', 'packed-refs', 'index'):
+                    relevant = True
+            elif path == self._repo.path:
+                if name in ('version', 'pending', 'ids', 'tasks'):
+                    relevant = True
+            else:
+                relevant = True
+        return relevant
+
+    def _reload(self):
+        self._repo.drop()
+        try:
+            self._repo.warm()
+        except Exception:
+            # reported to the client running the next command
+            self._repo.drop()
+
+    def _refuse(self, req):
+        if req.get('version') != PROTOCOL_VERSION:
+            return 'protocol version mismatch'
+        if req.get('config') != self._conf_hash:
+            return 'config mismatch'
+        if req.get('env') != { var : os.environ.get(var) for var in _ENV_SHARED }:
+            return 'environment mismatch'
+        return None
+
+    def _execute(self, req):
+        """
+        Run the command from the request with sys.stdout and sys.stderr
+        redirected, return the exit status.
+        """
+        try:
+            args = self._parser.parse_args(req['argv'])
+            if not self._cmds.get(args.parser, {}).get('daemon', False):
+                sys.stderr.write('td: command "%s" cannot be run by the daemon\n' % args.parser)
+                return 2
+
+            args.execute(self._conf, args, self._repo)
+            return 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            sys.stderr.write('%s\n' % e.code)
+            return 1
+        except BrokenPipeError:
+            return 1
+        except Exception:
+            traceback.print_exc()
+            # the state may have been left inconsistent
+            self._repo.drop()
+            return 1
+
+    def _handle(self, conn):
+        msg, fds, flags, addr = socket.recv_fds(conn, 65536, 2)
+        try:
+            if not msg:
+                return
+            req = _frame_recv(conn, msg)
+
+            reason = self._refuse(req)
+            if reason is not None or len(fds) != 2:
+                conn.sendall(_frame_pack({ 'status' : 'refused', 'reason' : reason or 'no output descriptors' }))
+                return
+
+            # changes made just before the request might not have been
+            # seen by the main loop yet
+            if self._inotify is not None and self._events_relevant(self._inotify.read()):
+                self._repo.drop()
+
+            encoding = req.get('encoding') or 'utf-8'
+            out = open(fds[0], 'w', encoding = encoding, closefd = False)
+            err = open(fds[1], 'w', encoding = encoding, errors = 'backslashreplace', closefd = False)
+
+            stdout, stderr = sys.stdout, sys.stderr
+            sys.stdout, sys.stderr = out, err
+            try:
+                status = self._execute(req)
+            finally:
+                sys.stdout, sys.stderr = stdout, stderr
+                for f in (out, err):
+                    try:
+                        f.close()
+                    except OSError:
+                        pass
+
+            conn.sendall(_frame_pack({ 'status' : 'done', 'exit' : status }))
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def _listen(self):
+        path = self._path
+
+        # check for another daemon, remove a stale socket
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.remove(path)
+            else:
+                raise DaemonError('A daemon is already running on %s' % path)
+            finally:
+                probe.close()
+
+        sock  = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)
+        try:
+            sock.bind(path)
+        finally:
+            os.umask(umask)
+        sock.listen(16)
+
+        return sock
+
+    def serve(self):
+        """
+        Serve requests until terminated by a signal.
+        """
+        def terminate(signum, frame):
+            raise SystemExit(0)
+        signal.signal(signal.SIGTERM, terminate)
+
+        sock = self._listen()
+        try:
+            self._inotify = self._inotify_init()
+            self._reload()
+
+            sel = selectors.DefaultSelector()
+            sel.register(sock, selectors.EVENT_READ)
+            if self._inotify is not None:
+                sel.register(self._inotify, selectors.EVENT_READ)
+
+            reload_at = None
+            while True:
+                timeout = None if reload_at is None else max(0.0, reload_at - time.monotonic())
+
+                for key, mask in sel.select(timeout):
+                    if key.fileobj is self._inotify:
+                        if self._events_relevant(self._inotify.read()):
+                            reload_at = time.monotonic() + RELOAD_DELAY
+                        continue
+
+                    conn, addr = sock.accept()
+                    with conn:
+                        try:
+                            self._handle(conn)
+                        except (OSError, DaemonError, ValueError):
+                            # the client went away or sent garbage
+                            pass
+
+                if reload_at is not None and time.monotonic() >= reload_at:
+                    reload_at = None
+                    self._reload()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sock.close()
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            if self._inotify is not None:
+                self._inotify.close()
+
+def client_run(conf, argv):
+    """
+    Run the command given by argv (without the program name) in the daemon
+    serving the configured repository. Return its exit status, or None if the
+    command should be run directly.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socket_path(conf['repo_path']))
+            fds = [sys.stdout.fileno(), sys.stderr.fileno()]
+        except (OSError, AttributeError, ValueError):
+            return None
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        req = {
+            'version'  : PROTOCOL_VERSION,
+            'argv'     : argv,
+            'config'   : _config_hash(conf),
+            'env'      : { var : os.environ.get(var) for var in _ENV_SHARED },
+            'encoding' : sys.stdout.encoding,
+        }
+
+        try:
+            socket.send_fds(sock, [_frame_pack(req)], fds)
+            resp = _frame_recv(sock)
+        except (OSError, DaemonError):
+            # the command may or may not have run, so it must not be repeated
+            sys.stderr.write('td: lost the connection to the daemon\n')
+            return 1
+
+        if resp.get('status') != 'done':
+            return None
+        return resp.get('exit', 1)
+    finally:
+        sock.close()
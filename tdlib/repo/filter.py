@@ -13,29 +13,57 @@
 # You should have received a copy of the GNU General Public License along
 # with td. If not, see <http://www.gnu.org/licenses/>.
 
-import dateutil.parser
 import uuid
 
+from ..utils import dates, profiling
+
 class _FilterTerm:
     _type = None
     _val  = None
     _mod  = None
 
     # filter types
-    _FILTER_UUID      = 0
-    _FILTER_ID        = 1
-    _FILTER_TEXT      = 2
-    _FILTER_CREATED   = 3
-    _FILTER_DUE       = 4
-    _FILTER_SCHEDULED = 5
-    _FILTER_TAG       = 6
-    _FILTER_BLOCKED   = 7
-    _FILTER_BLOCKING  = 8
-    _FILTER_URGENCY   = 9
+    _FILTER_UUID       = 0
+    _FILTER_ID         = 1
+    _FILTER_TEXT       = 2
+    _FILTER_CREATED    = 3
+    _FILTER_DUE        = 4
+    _FILTER_SCHEDULED  = 5
+    _FILTER_TAG        = 6
+    _FILTER_BLOCKED    = 7
+    _FILTER_BLOCKING   = 8
+    _FILTER_URGENCY    = 9
+    _FILTER_TEXT_ICASE = 10
+    _FILTER_STATUS     = 11
 
     # filter modifiers
-    _MOD_ABOVE = 0
-    _MOD_BELOW = 1
+    _MOD_ABOVE  = 0
+    _MOD_BELOW  = 1
+    _MOD_BEFORE = 2
+    _MOD_AFTER  = 3
+
+    # the task fields matched by the date filter types
+    _date_fields = {
+        _FILTER_CREATED   : 'date_created',
+        _FILTER_DUE       : 'date_due',
+        _FILTER_SCHEDULED : 'date_scheduled',
+    }
+
+    # estimated relative cost of evaluating each filter type
+    _costs = {
+        _FILTER_STATUS     : 1,
+        _FILTER_UUID       : 1,
+        _FILTER_ID         : 1,
+        _FILTER_BLOCKED    : 2,
+        _FILTER_BLOCKING   : 2,
+        _FILTER_URGENCY    : 3,
+        _FILTER_CREATED    : 5,
+        _FILTER_DUE        : 5,
+        _FILTER_SCHEDULED  : 5,
+        _FILTER_TAG        : 6,
+        _FILTER_TEXT       : 8,
+        _FILTER_TEXT_ICASE : 9,
+    }
 
     def __init__(self, term):
         type = None
@@ -52,15 +80,30 @@ class _FilterTerm:
                 val  = (int(val),)
             elif prefix == 'text':
                 type = self._FILTER_TEXT
-            elif prefix == 'created':
-                type = self._FILTER_CREATED
-            elif prefix == 'due':
-                type = self._FILTER_DUE
-            elif prefix == 'scheduled':
-                type = self._FILTER_SCHEDULED
+            elif prefix == 'text.icase':
+                type = self._FILTER_TEXT_ICASE
+            elif prefix.partition('.')[0] in ('created', 'due', 'scheduled'):
+                field, _, mod = prefix.partition('.')
+                if field == 'created':
+                    type = self._FILTER_CREATED
+                elif field == 'due':
+                    type = self._FILTER_DUE
+                else:
+                    type = self._FILTER_SCHEDULED
+
+                if mod == 'before':
+                    self._mod = self._MOD_BEFORE
+                elif mod == 'after':
+                    self._mod = self._MOD_AFTER
+                elif mod:
+                    raise ValueError('Unknown date modifier: %s' % prefix)
             elif prefix == 'tag':
                 type = self._FILTER_TAG
                 val  = (val,)
+            elif prefix == 'status':
+                type = self._FILTER_STATUS
+                if not val in ('pending', 'completed', 'any'):
+                    raise ValueError('Unknown status: %s' % val)
             elif prefix == 'flag':
                 if val == 'blocked':
                     type = self._FILTER_BLOCKED
@@ -94,9 +137,12 @@ class _FilterTerm:
 
         self._type = type
 
-        if (type == self._FILTER_UUID or
-            type == self._FILTER_TEXT):
+        if (type == self._FILTER_UUID   or
+            type == self._FILTER_TEXT   or
+            type == self._FILTER_STATUS):
             self._val = val
+        elif (type == self._FILTER_TEXT_ICASE):
+            self._val = val.casefold().split()
         elif (type == self._FILTER_TAG or
               type == self._FILTER_ID):
             self._val = set(val)
@@ -106,7 +152,15 @@ class _FilterTerm:
         elif (type == self._FILTER_URGENCY):
             self._val = float(val)
         else:
-            self._val = dateutil.parser.parse(val)
+            # the range of matching dates as (start, end), the start is
+            # included, the end is not, None stands for an unbounded end
+            date = dates.parse_user(val)
+            if self._mod == self._MOD_BEFORE:
+                self._val = (None, date)
+            elif self._mod == self._MOD_AFTER:
+                self._val = (date, None)
+            else:
+                self._val = dates.local_day(date)
 
     def task_match(self, task):
         if self._type == self._FILTER_UUID:
@@ -115,24 +169,176 @@ class _FilterTerm:
             return task.id in self._val
         if self._type == self._FILTER_TEXT:
             return (task.text is not None) and self._val in task.text
+        if self._type == self._FILTER_TEXT_ICASE:
+            if task.text is None:
+                return False
+            text = task.text.casefold()
+            for word in self._val:
+                if not word in text:
+                    return False
+            return True
         if self._type == self._FILTER_BLOCKED:
             return task.blocked
         if self._type == self._FILTER_BLOCKING:
             return task.blocking
         if self._type == self._FILTER_URGENCY:
+            # completed tasks have no urgency
+            if task.urgency is None:
+                return False
             if self._mod == self._MOD_ABOVE:
                 return task.urgency >= self._val
             elif self._mod == self._MOD_BELOW:
                 return task.urgency <= self._val
+        if self._type == self._FILTER_STATUS:
+            if self._val == 'pending':
+                return not task.completed
+            elif self._val == 'completed':
+                return task.completed
+            return True
         if self._type == self._FILTER_TAG:
             for tag in self._val:
                 if tag in task.tags:
                     return True
 
             return False
+        if self._type in self._date_fields:
+            date = getattr(task, self._date_fields[self._type])
+            if date is None:
+                return False
+
+            start, end = self._val
+            return ((start is None or date >= start) and
+                    (end   is None or date <  end))
 
         raise NotImplementedError
 
+    def cost(self):
+        return self._costs[self._type]
+
+    def has_status(self):
+        return self._type == self._FILTER_STATUS
+
+    def status_completed(self):
+        """
+        Get the result of this term for a completed task, if it is known
+        without looking at the task, None otherwise.
+        """
+        if self._type == self._FILTER_STATUS:
+            return self._val != 'pending'
+        return None
+
+    def candidates(self, index, completed = False):
+        """
+        Get a set of UUIDs containing all the pending tasks (or the completed
+        ones, if completed is True) matching this term, looked up in the given
+        TaskIndex. Return None if the index cannot answer the term.
+        """
+        if completed:
+            if self.status_completed() is False:
+                return set()
+            if self._type == self._FILTER_UUID:
+                return { self._val }
+            # the short IDs and the text index cover the completed tasks,
+            # the other lookups only the pending ones
+            if not self._type in (self._FILTER_ID, self._FILTER_TEXT, self._FILTER_TEXT_ICASE):
+                return None
+
+        if self._type == self._FILTER_UUID:
+            return index.lookup_uuid(self._val)
+        if self._type == self._FILTER_ID:
+            return index.lookup_ids(self._val)
+        if self._type == self._FILTER_TEXT:
+            return index.lookup_text((self._val,))
+        if self._type == self._FILTER_TEXT_ICASE:
+            return index.lookup_text(self._val)
+        if self._type == self._FILTER_TAG:
+            return index.lookup_tags(self._val)
+        if self._type == self._FILTER_BLOCKED:
+            return index.lookup_flag('blocked')
+        if self._type == self._FILTER_BLOCKING:
+            return index.lookup_flag('blocking')
+        if self._type in self._date_fields:
+            start, end = self._val
+            return index.lookup_dates(self._date_fields[self._type], start, end)
+        return None
+
+    def compile(self):
+        """
+        Return a function task -> bool equivalent to task_match(), but
+        specialised for this term.
+        """
+        val = self._val
+
+        if self._type == self._FILTER_UUID:
+            return lambda task: task.uuid == val
+        if self._type == self._FILTER_ID:
+            return lambda task: task.id in val
+        if self._type == self._FILTER_TEXT:
+            def match(task):
+                text = task.text
+                return (text is not None) and val in text
+            return match
+        if self._type == self._FILTER_TEXT_ICASE:
+            def match(task):
+                text = task.text
+                if text is None:
+                    return False
+                text = text.casefold()
+                for word in val:
+                    if not word in text:
+                        return False
+                return True
+            return match
+        if self._type == self._FILTER_BLOCKED:
+            return lambda task: task.blocked
+        if self._type == self._FILTER_BLOCKING:
+            return lambda task: task.blocking
+        if self._type == self._FILTER_URGENCY:
+            if self._mod == self._MOD_ABOVE:
+                def match(task):
+                    urgency = task.urgency
+                    return urgency is not None and urgency >= val
+            elif self._mod == self._MOD_BELOW:
+                def match(task):
+                    urgency = task.urgency
+                    return urgency is not None and urgency <= val
+            return match
+        if self._type == self._FILTER_STATUS:
+            if val == 'pending':
+                return lambda task: not task.completed
+            elif val == 'completed':
+                return lambda task: task.completed
+            return lambda task: True
+        if self._type == self._FILTER_TAG:
+            if len(val) == 1:
+                tag, = val
+                return lambda task: tag in task.tags
+            def match(task):
+                tags = task.tags
+                for tag in val:
+                    if tag in tags:
+                        return True
+                return False
+            return match
+        if self._type in self._date_fields:
+            field      = self._date_fields[self._type]
+            start, end = val
+            if start is None:
+                def match(task):
+                    date = getattr(task, field)
+                    return date is not None and date < end
+            elif end is None:
+                def match(task):
+                    date = getattr(task, field)
+                    return date is not None and date >= start
+            else:
+                def match(task):
+                    date = getattr(task, field)
+                    return date is not None and start <= date < end
+            return match
+
+        raise ValueError('Invalid filter type: %d' % self._type)
+
 class FilterSyntaxError(Exception):
     pass
 
@@ -161,6 +367,108 @@ class _Tree:
         elif self._operator == 'not':
             return not self._op0.task_match(task)
 
+    def _operands(self):
+        """
+        Get the list of operands of this node, with nested nodes with the
+        same (associative) binary operator merged into it.
+        """
+        ret = []
+        for op in (self._op0, self._op1):
+            if isinstance(op, _Tree) and op._operator == self._operator:
+                ret.extend(op._operands())
+            else:
+                ret.append(op)
+        return ret
+
+    def cost(self):
+        if self._operator == 'not':
+            return self._op0.cost()
+        return sum(op.cost() for op in self._operands())
+
+    def has_status(self):
+        if self._operator == 'not':
+            return self._op0.has_status()
+        return any(op.has_status() for op in self._operands())
+
+    def status_completed(self):
+        if self._operator == 'not':
+            val = self._op0.status_completed()
+            return None if val is None else not val
+
+        vals = [op.status_completed() for op in self._operands()]
+        if self._operator == 'and':
+            if False in vals:
+                return False
+            if None in vals:
+                return None
+            return True
+        elif self._operator == 'or':
+            if True in vals:
+                return True
+            if None in vals:
+                return None
+            return False
+
+    def candidates(self, index, completed = False):
+        if self._operator == 'not':
+            return None
+
+        ops = self._operands()
+
+        if self._operator == 'and':
+            # the terms that cannot be looked up are checked by the filter
+            sets = [c for c in (op.candidates(index, completed) for op in ops) if c is not None]
+            if not sets:
+                return None
+            sets.sort(key = len)
+            ret = set(sets[0])
+            for c in sets[1:]:
+                ret &= c
+            return ret
+        elif self._operator == 'or':
+            ret = set()
+            for op in ops:
+                c = op.candidates(index, completed)
+                if c is None:
+                    return None
+                ret |= c
+            return ret
+
+    def compile(self):
+        """
+        Return a function task -> bool equivalent to task_match(), evaluating
+        the cheapest operands first.
+        """
+        if self._operator == 'not':
+            op = self._op0.compile()
+            return lambda task: not op(task)
+
+        ops = sorted(self._operands(), key = lambda op: op.cost())
+        ops = [op.compile() for op in ops]
+
+        if self._operator == 'and':
+            if len(ops) == 2:
+                op0, op1 = ops
+                return lambda task: op0(task) and op1(task)
+            def match(task):
+                for op in ops:
+                    if not op(task):
+                        return False
+                return True
+            return match
+        elif self._operator == 'or':
+            if len(ops) == 2:
+                op0, op1 = ops
+                return lambda task: op0(task) or op1(task)
+            def match(task):
+                for op in ops:
+                    if op(task):
+                        return True
+                return False
+            return match
+
+        raise ValueError('Invalid operator: %s' % self._operator)
+
 _unary_operators = ('not',)
 _binary_operators = ('or', 'and')
 
@@ -245,11 +553,46 @@ class TaskFilter:
 
     _parse_tree = None
 
+    """the compiled filter expression"""
+    _match      = None
+
     def __init__(self, filter_expr):
-        if len(filter_expr):
-            self._parse_tree = _parse_filter_expr(filter_expr)
+        with profiling.span('filter.compile'):
+            if len(filter_expr):
+                self._parse_tree = _parse_filter_expr(filter_expr)
+                self._match      = self._parse_tree.compile()
+            else:
+                self._match      = lambda task: True
+
+    def candidates(self, index, completed = False):
+        """
+        Get a set of UUIDs containing all the pending tasks (or the completed
+        ones, if completed is True) matching the filter, or None if every task
+        needs to be checked.
+        """
+        if self._parse_tree is None:
+            return None
+        return self._parse_tree.candidates(index, completed)
+
+    def empty(self):
+        """
+        Check whether the filter matches all tasks without looking at them.
+        """
+        return self._parse_tree is None
+
+    def match_completed(self):
+        """
+        Check whether the filter can match completed tasks.
+        """
+        if self._parse_tree is None or not self._parse_tree.has_status():
+            return False
+        return self._parse_tree.status_completed() is not False
+
+    def matcher(self):
+        """
+        Get a function task -> bool, equivalent to task_match().
+        """
+        return self._match
 
     def task_match(self, task):
-        if self._parse_tree != None:
-            return self._parse_tree.task_match(task)
-        return True
+        return self._match(task)
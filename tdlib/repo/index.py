@@ -0,0 +1,202 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+
+from .tag_trie import TagTrie
+
+class _DateIndex:
+    """
+    The pending tasks with one date field set, sorted by its value.
+    """
+
+    ### private ###
+    """the dates as sorted POSIX timestamps"""
+    _keys      = None
+
+    """the task UUIDs, in the same order as _keys"""
+    _uuids     = None
+
+    """a dict of { task uuid : its timestamp in _keys }"""
+    _task_keys = None
+
+    def __init__(self, task_dates):
+        """
+        task_dates is an iterable of (task uuid, aware datetime or None).
+        """
+        self._task_keys = { u : d.timestamp() for u, d in task_dates if d is not None }
+
+        entries = sorted((k, u) for u, k in self._task_keys.items())
+        self._keys  = [k for k, u in entries]
+        self._uuids = [u for k, u in entries]
+
+    def add(self, task_uuid, date):
+        if date is None:
+            return
+
+        key = date.timestamp()
+        idx = bisect.bisect_right(self._keys, key)
+        self._keys.insert(idx, key)
+        self._uuids.insert(idx, task_uuid)
+        self._task_keys[task_uuid] = key
+
+    def remove(self, task_uuid):
+        key = self._task_keys.pop(task_uuid, None)
+        if key is None:
+            return
+
+        idx = bisect.bisect_left(self._keys, key)
+        while self._uuids[idx] != task_uuid:
+            idx += 1
+        del self._keys[idx]
+        del self._uuids[idx]
+
+    def lookup(self, start, end):
+        """
+        Get the tasks with start <= date < end, either bound may be None.
+        """
+        lo = 0               if start is None else bisect.bisect_left(self._keys, start.timestamp())
+        hi = len(self._keys) if end   is None else bisect.bisect_left(self._keys, end.timestamp())
+        return set(self._uuids[lo:hi])
+
+class TaskIndex:
+    """
+    Lookup structures over the pending tasks of a repository state, built on
+    first use. The short ID and text lookups cover the completed tasks as well.
+    """
+
+    ### private ###
+    """the dict of { task uuid : RepositoryTask } of the pending tasks"""
+    _tasks = None
+
+    """a dict of { short id : task uuid }"""
+    _ids   = None
+
+    """a TagTrie of the pending tasks, None if not built yet"""
+    _tags  = None
+
+    """a dict of { task date field name : _DateIndex }, for the fields looked up so far"""
+    _dates = None
+
+    """a TextIndex over all the tasks, None if disabled"""
+    _text  = None
+
+    """a dict of { flag name : set of task UUIDs }, None if not built yet"""
+    _flags = None
+
+    def __init__(self, tasks, ids, text = None):
+        self._tasks = tasks
+        self._ids   = ids
+        self._text  = text
+
+        self._dates = {}
+
+    def _tags_get(self):
+        if self._tags is None:
+            self._tags = TagTrie()
+            for task in self._tasks.values():
+                self._tags_add(task)
+        return self._tags
+
+    def _tags_add(self, task):
+        for tag in task.tags:
+            self._tags.add(task.uuid, tag)
+
+    def _tags_remove(self, task):
+        for tag in task.tags:
+            self._tags.remove(task.uuid, tag)
+
+    def task_add(self, task):
+        """
+        Called after a task was added to the pending tasks.
+        """
+        if self._tags is not None:
+            self._tags_add(task)
+        for field, dates in self._dates.items():
+            dates.add(task.uuid, getattr(task, field))
+        self._flags = None
+
+    def task_remove(self, task):
+        """
+        Called after a task was removed from the pending tasks.
+        """
+        if self._tags is not None:
+            self._tags_remove(task)
+        for dates in self._dates.values():
+            dates.remove(task.uuid)
+        self._flags = None
+
+    def lookup_uuid(self, task_uuid):
+        return { task_uuid } if task_uuid in self._tasks else set()
+
+    def lookup_ids(self, ids):
+        return { self._ids[i] for i in ids if i in self._ids }
+
+    def lookup_tags(self, tags):
+        """
+        Get the tasks tagged with any of the given tags or their subtags.
+        """
+        trie = self._tags_get()
+
+        ret = set()
+        for tag in tags:
+            ret |= trie.lookup(tag)
+        return ret
+
+    def tag_counts(self):
+        """
+        Get a sorted list of (tag, number of pending tasks tagged with it or
+        its subtags) for all the tags, including the implicit parent tags.
+        """
+        return self._tags_get().counts()
+
+    def lookup_dates(self, field, start, end):
+        """
+        Get the tasks with start <= date < end in the given date field (e.g.
+        'date_due'), either bound may be None.
+        """
+        if not field in self._dates:
+            self._dates[field] = _DateIndex((task.uuid, getattr(task, field))
+                                            for task in self._tasks.values())
+        return self._dates[field].lookup(start, end)
+
+    def lookup_text(self, strings):
+        """
+        Get the tasks whose text may contain all the given strings, ignoring
+        case, or None if they cannot be looked up.
+        """
+        if self._text is None:
+            return None
+
+        ret = None
+        for string in strings:
+            tasks = self._text.lookup(string)
+            if tasks is not None:
+                ret = tasks if ret is None else ret & tasks
+        return ret
+
+    def lookup_flag(self, flag):
+        """
+        Get the tasks with the given flag ('blocked' or 'blocking') set.
+        """
+        if self._flags is None:
+            self._flags = { 'blocked' : set(), 'blocking' : set() }
+            for task in self._tasks.values():
+                if task.blocked:
+                    self._flags['blocked'].add(task.uuid)
+                if task.blocking:
+                    self._flags['blocking'].add(task.uuid)
+
+        return self._flags[flag]
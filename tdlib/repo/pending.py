@@ -13,7 +13,7 @@
 # You should have received a copy of the GNU General Public License along
 # with td. If not, see <http://www.gnu.org/licenses/>.
 
-import os
+import os.path
 
 class Pending:
 
@@ -21,14 +21,28 @@ class Pending:
     path = None
 
     ### private ###
-    """list of pending tasks UUIDs"""
+    """
+    a dict of { pending task UUID : position }, giving constant-time lookups
+    while preserving the order from the file; the positions are increasing
+    along the list, but not necessarily contiguous
+    """
     _data = None
 
+    """the position to assign to the next added task"""
+    _next = None
+
+    """the data was changed since it was read/written"""
+    _dirty = None
+
     def __init__(self, path):
         with open(path, 'r') as pending_file:
-            self._data = list(map(str.strip, pending_file.readlines()))
+            self._data = {}
+            self._next = 0
+            for line in pending_file:
+                self.add(line.strip())
 
-        self.path = path
+        self.path   = path
+        self._dirty = False
 
     def __len__(self):
         return len(self._data)
@@ -39,20 +53,34 @@ class Pending:
     def __iter__(self):
         return iter(self._data)
 
+    def position(self, taskid):
+        """
+        Get a key that sorts the pending tasks in the list order.
+        """
+        return self._data[taskid]
+
     def __delitem__(self, taskid):
-        del self._data[self._data.index(taskid)]
-        self._write()
+        del self._data[taskid]
+        self._dirty = True
 
     def add(self, taskid):
-        self._data.append(taskid)
-        self._write()
-
-    def _write(self):
-        tmpname = self.path + '.tmp'
-        with open(tmpname, 'wt', newline = '\n') as tmpfile:
-            for l in self._data:
-                tmpfile.write(l)
-                tmpfile.write('\n')
-            tmpfile.flush()
-            os.fsync(tmpfile.fileno())
-        os.replace(tmpname, self.path)
+        # re-adding an existing UUID moves it to the end, as with a list
+        self._data.pop(taskid, None)
+        self._data[taskid] = self._next
+        self._next += 1
+        self._dirty = True
+
+    def write(self, txn):
+        """
+        Add the changes made since the last write to the given transaction.
+        Return True if there was anything to write, False otherwise.
+        """
+        if not self._dirty:
+            return False
+
+        txn.write(os.path.relpath(self.path, txn.path),
+                  ''.join(l + '\n' for l in self._data))
+
+        self._dirty = False
+
+        return True
@@ -16,7 +16,6 @@
 
 import collections
 import datetime
-import dateutil.parser
 import json
 import math
 import os
@@ -26,7 +25,16 @@ import shutil
 import uuid
 
 from . import filter as task_filter
+from . import index
 from . import pending
+from . import snapshot
+from . import stamp
+from . import text_index
+from . import transaction
+from . import urgency
+
+from ..config        import parse_bool
+from ..utils         import profiling
 
 from .repository_mod import TaskWrite, TaskDelete
 from .task           import RepositoryTask
@@ -34,6 +42,18 @@ from .task           import RepositoryTask
 
 SUPPORTED_VERSION = 0
 
+"""
+Name of the file in the git dir recording the state of a working tree known
+to be clean.
+"""
+CLEAN_STAMP_NAME = 'td_clean'
+
+"""
+Minimum number of task files to be read for the parallel loader to be used,
+below that starting the worker processes costs more than it saves.
+"""
+PARALLEL_LOAD_MIN = 2048
+
 
 class UnsupportedVersionError(Exception):
     repo_version      = None
@@ -61,18 +81,35 @@ class Repository:
     """the repository-related config file section"""
     _config = None
 
-    def __init__(self, path, config):
-        self.path    = path
-        self._config = config
+    """always scan the whole working tree for changes"""
+    _paranoid = None
+
+    def __init__(self, path, config, paranoid = False):
+        self.path      = path
+        self._config   = config
+        self._paranoid = paranoid
 
     def load(self):
-        return _RepositoryState(self, self._config)
+        with profiling.span('repo.load'):
+            return _RepositoryState(self, self._config)
 
     def update_ids(self):
-        baserepo = _RepositoryStateBase(self.path)
-        baserepo.update_ids()
+        """
+        Write the short IDs of the pending tasks if they changed. Return True
+        if that made a commit.
+        """
+        with profiling.span('update_ids'):
+            baserepo = _RepositoryStateBase(self.path, self._paranoid)
+            return baserepo.update_ids()
 
 class _RepositoryStateBase:
+    ### public ###
+    """
+    the stamp of the repository state checked to be clean when it was
+    opened, or written after the last commit, see stamp.repo_stamp()
+    """
+    clean_stamp = None
+
     ### private ###
     _path   = None
 
@@ -85,50 +122,144 @@ class _RepositoryStateBase:
     """List of entries for the current commit"""
     _commit_msgs = None
 
-    def __init__(self, path):
+    def __init__(self, path, paranoid = False):
         self._path        = path
         self._commit_msgs = []
 
-        try:
-            self._repo = pygit2.Repository(path)
-        except KeyError:
-            raise ValueError('Could not open path "%s" as a git repository' % path)
+        with profiling.span('repo.open'):
+            try:
+                self._repo = pygit2.Repository(path)
+            except KeyError:
+                raise ValueError('Could not open path "%s" as a git repository' % path)
 
-        for filepath, flags in self._repo.status().items():
-            if flags & ~(pygit2.GIT_STATUS_CURRENT | pygit2.GIT_STATUS_IGNORED):
-                raise DirtyRepositoryError()
+        with profiling.span('repo.status'):
+            self._check_clean(paranoid)
 
         with open(os.path.join(path, 'version'), 'r') as ver_file:
             self._ver  = int(ver_file.read())
             if self._ver != SUPPORTED_VERSION:
                 raise UnsupportedVersionError(self._ver, SUPPORTED_VERSION)
 
-    def _commit_changes(self, msg_title = 'Untitled commit'):
-        commit = False
+    def _clean_stamp(self):
+        """
+        Get a string identifying the current state of the HEAD, the index and
+        the files and directories td writes, see stamp.files_stamp().
+        """
+        return stamp.repo_stamp(self._path, str(self._repo.head.target))
+
+    def _clean_stamp_path(self):
+        return os.path.join(self._repo.path, CLEAN_STAMP_NAME)
+
+    def _clean_stamp_write(self, clean_stamp):
+        self.clean_stamp = clean_stamp
+        try:
+            with open(self._clean_stamp_path(), 'w') as f:
+                f.write(clean_stamp)
+        except OSError:
+            pass
+
+    def _clean_stamp_remove(self):
+        try:
+            os.remove(self._clean_stamp_path())
+        except FileNotFoundError:
+            pass
+
+    def _check_clean(self, paranoid):
+        """
+        Raise DirtyRepositoryError if the working tree contains changes.
+
+        Scanning the whole working tree is expensive for large repositories,
+        so unless paranoid is True the scan is skipped if the stamp written
+        by td after its last commit or check is still valid.
+        """
+        # taken before the scan, so that a change made during it leaves the
+        # written stamp invalid
+        clean_stamp = self._clean_stamp()
+
+        if not paranoid:
+            try:
+                with open(self._clean_stamp_path(), 'r') as f:
+                    if f.read() == clean_stamp:
+                        self.clean_stamp = clean_stamp
+                        return
+            except OSError:
+                pass
+
         for filepath, flags in self._repo.status().items():
-            if flags & pygit2.GIT_STATUS_INDEX_MODIFIED:
-                commit = True
-                break
-        if commit:
+            if flags & ~(pygit2.GIT_STATUS_CURRENT | pygit2.GIT_STATUS_IGNORED):
+                raise DirtyRepositoryError()
+
+        self._clean_stamp_write(clean_stamp)
+
+    @profiling.spanned('commit')
+    def _commit_changes(self, txn, msg_title = 'Untitled commit'):
+        """
+        Apply the transaction to the working tree and commit it.
+
+        The commit tree is built from the parent commit tree and the changed
+        objects only, without going through the index. The index is updated
+        afterwards, so that it matches the new HEAD.
+        """
+        # if anything fails from here on, the next open must do a full check
+        self._clean_stamp_remove()
+
+        txn.write_files()
+
+        parent = self._repo.head.peel()
+        tree   = txn.write_tree(self._repo, parent.tree)
+        if tree != parent.tree.id:
             commit_msg = msg_title + '\n\n' + '\n'.join(self._commit_msgs)
 
-            parent  = self._repo.head.peel()
             sig = self._repo.default_signature
 
-            self._repo.index.write()
-            tree = self._repo.index.write_tree()
+            self._repo.create_commit('HEAD', sig, sig, commit_msg, tree, [parent.id])
+
+        with profiling.span('index.write'):
+            txn.write_index(self._repo.index)
 
-            self._repo.create_commit('HEAD', sig, sig, commit_msg, tree, [parent.hex])
+        self._commit_msgs = []
 
-            self._commit_msgs = []
+        self._clean_stamp_write(self._clean_stamp())
 
     def update_ids(self):
-        shutil.copy2(os.path.join(self._path, 'pending'), os.path.join(self._path, 'ids'))
-        self._repo.index.add('ids')
-        self._repo.index.write()
-        self._commit_changes('Update short IDs')
+        with open(os.path.join(self._path, 'pending'), 'r') as pending_file:
+            ids = pending_file.read()
+        with open(os.path.join(self._path, 'ids'), 'r') as ids_file:
+            if ids_file.read() == ids:
+                return False
+
+        txn = transaction.Transaction(self._path)
+        txn.write('ids', ids)
+        self._commit_changes(txn, 'Update short IDs')
+        return True
 
 
+def _task_files_load(tasks_dir, task_uuids):
+    """
+    Read and unpack the given task files. Executed in the worker processes of
+    the parallel loader.
+    """
+    ret = []
+    for task_uuid in task_uuids:
+        with open(os.path.join(tasks_dir, task_uuid), 'rt') as task_fp:
+            ret.append(json.load(task_fp))
+    return ret
+
+def _load_workers(val):
+    workers = int(val)
+    if workers > 0:
+        return workers
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _completed_sort_key(task):
+    # tasks without a completion date (e.g. imported) go first
+    if task.date_completed is None:
+        return (0, 0.0, task.uuid)
+    return (1, task.date_completed.timestamp(), task.uuid)
+
 class _RepositoryState(_RepositoryStateBase):
     parent = None
 
@@ -143,6 +274,48 @@ class _RepositoryState(_RepositoryStateBase):
     """a dict of { task uuid : short id }"""
     _ids = None
 
+    """a dict of { short id : task uuid }, the reverse of _ids"""
+    _ids_rev = None
+
+    """number of lines in the ids file"""
+    _ids_len = None
+
+    """
+    a dict of { task uuid : set of UUIDs of pending tasks depending on it },
+    the task itself need not be pending; only valid if _graph_loaded is True
+    """
+    _dependents = None
+
+    """
+    the fields of the pending tasks that depend on other tasks (blocked,
+    blocking, dependents, urgency) have been computed
+    """
+    _graph_loaded = None
+
+    """task files were read since the snapshot was loaded or stored"""
+    _snapshot_dirty = None
+
+    """a TaskIndex over the pending tasks"""
+    _index = None
+
+    """the UrgencyEngine computing the urgency of the pending tasks"""
+    _urgency = None
+
+    """
+    a dict of { task uuid : timestamp until which its urgency is valid } for
+    the pending tasks, filled when the graph is loaded
+    """
+    _urgency_expiry = None
+
+    """
+    the urgency values cached in the snapshot, as stored in
+    Snapshot.urgency, None if there are none valid for the current state
+    """
+    _urgency_cache = None
+
+    """a TextIndex over all the tasks, None if disabled in the config"""
+    _text_index = None
+
     _modified = None
 
     """Task fields to pack into JSON"""
@@ -150,7 +323,7 @@ class _RepositoryState(_RepositoryStateBase):
     _date_fields = ('date_created', 'date_completed', 'date_due', 'date_scheduled')
 
     def __init__(self, parent, config):
-        super().__init__(parent.path)
+        super().__init__(parent.path, parent._paranoid)
 
         self.parent  = parent
         self._config = config
@@ -159,6 +332,11 @@ class _RepositoryState(_RepositoryStateBase):
 
         self._load_short_ids()
 
+        self._urgency = urgency.UrgencyEngine(self._config.urgency.factors)
+
+        if parse_bool(self._config.text_index):
+            self._text_index = text_index.TextIndex(self._repo)
+
         # create the directories if they do not exist
         # this could happen if they do not contain anything, since git does
         # not track empty dirs
@@ -167,116 +345,328 @@ class _RepositoryState(_RepositoryStateBase):
             if not os.path.isdir(dirpath):
                 os.mkdir(dirpath)
 
-        self._pending     = pending.Pending(os.path.join(self._path, 'pending'))
-        self._reload_pending_tasks()
-
-    def _calc_urgency(self, task):
-        f = self._config['urgency.factors']
-
-        val = 0.0
-
-        val += float(f['dependents']) * math.log2(1.0 + len(task.dependents))
-
-        if task.blocked:
-            val += float(f['blocked'])
-
-        if task.date_scheduled is not None:
-            high = float(f['scheduled_high'])
-            low  = float(f['scheduled_low'])
-            at   = int(f['scheduled_activetime'])
-
-            now = datetime.datetime.now(datetime.timezone.utc)
-            delta = (now - task.date_scheduled).total_seconds()
-
-            if at != 0:
-                slope = (high - low) / at
-                val += max(low, min(high, slope * delta + high))
-            else:
-                val += high if delta >= 0 else low
-
-        if task.date_due is not None:
-            high = float(f['due_high'])
-            pre  = int(f['due_time_pre'])
-            post = int(f['due_time_post'])
-
-            now = datetime.datetime.now(datetime.timezone.utc)
-            delta = (now - task.date_due).total_seconds()
-
-            if (pre + post) != 0:
-                slope  = (pre + post) / high
-                offset = pre * slope
-                val += max(0.0, min(high, slope * delta + offset))
-            else:
-                val += high if delta >= 0 else 0.0
-
-        for tag in f['tags']:
-            if tag in task.tags:
-                val += float(f['tags'][tag])
-
-        task.urgency = val
+        with profiling.span('pending.load'):
+            self._pending     = pending.Pending(os.path.join(self._path, 'pending'))
+            self._reload_pending_tasks()
+        with profiling.span('snapshot.load'):
+            self._snapshot_load()
 
-    def _task_load(self, task_uuid):
-        t = RepositoryTask(self)
+    def _calc_urgency(self, task, now):
+        task.urgency = self._urgency.task_urgency(task, self._index, now)
+        self._urgency_expiry[task.uuid] = self._urgency.urgency_expiry(task, now)
 
+    def _task_data_load(self, task_uuid):
+        """
+        Read and unpack the file for the task with the given UUID.
+        """
         with open(os.path.join(self._path, 'tasks', task_uuid), 'rt') as task_fp:
             data = json.load(task_fp)
 
-            for fm in self._field_maps:
-                if fm in data:
-                    setattr(t, fm, data[fm])
-
-            if 'tags' in data:
-                for tag in data['tags']:
-                    t.tags.add(tag)
+        self._snapshot_dirty = True
 
-            if 'depends' in data:
-                for dep in data['depends']:
-                    t.dependencies.add(dep)
-
-            if 'tw_extra' in data:
-                t.tw_extra = data['tw_extra']
-
-            for d in self._date_fields:
-                if d in data:
-                    val = dateutil.parser.parse(data[d])
-                    setattr(t, d, val)
+        return data
 
-        t.uuid      = task_uuid
-        t.completed = not task_uuid in self._pending
-
-        t.blocked = False
-        for dep in t.dependencies:
-            if dep in self._pending:
-                t.blocked = True
-                break
+    def _task_load(self, task_uuid, data = None):
+        """
+        Create a task object for the task with the given UUID. If data is not
+        None, it is used as the unpacked task file contents, otherwise the
+        file is only read when the task fields are accessed.
+        """
+        t = RepositoryTask(self, task_uuid, not task_uuid in self._pending, data)
 
         if task_uuid in self._ids:
             t.id = self._ids[task_uuid]
 
         return t
 
+    def _pending_data_load(self):
+        """
+        Read the files of all the pending tasks not loaded yet. When there are
+        many of them, they are read in batches by a pool of worker processes,
+        as configured by load.workers.
+        """
+        task_uuids = [u for u, t in self._pending_tasks.items() if t._data is None]
+        if not task_uuids:
+            return
+
+        with profiling.span('tasks.parse'):
+            tasks_dir = os.path.join(self._path, 'tasks')
+            workers   = _load_workers(self._config.load.workers)
+
+            if workers > 1 and len(task_uuids) >= PARALLEL_LOAD_MIN:
+                # several batches per worker, so that they are evenly loaded
+                batch_size = -(-len(task_uuids) // (workers * 4))
+                batches    = [task_uuids[i:i + batch_size]
+                              for i in range(0, len(task_uuids), batch_size)]
+
+                import concurrent.futures
+
+                with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                    results = list(pool.map(_task_files_load, [tasks_dir] * len(batches), batches))
+            else:
+                batches = [task_uuids]
+                results = [_task_files_load(tasks_dir, task_uuids)]
+
+            for batch, data in zip(batches, results):
+                for task_uuid, task_data in zip(batch, data):
+                    self._pending_tasks[task_uuid]._data = task_data
+
+            self._snapshot_dirty = True
+
     def _reload_pending_tasks(self):
         self._pending_tasks = {}
         for uuid_val in self._pending:
             self._pending_tasks[uuid_val] = self._task_load(uuid_val)
 
-        for task in self._pending_tasks.values():
-            for dep in task.dependencies:
-                if dep in self._pending_tasks:
-                    self._pending_tasks[dep].dependents.add(task.uuid)
-                    self._pending_tasks[dep].blocking = True
+        self._graph_loaded = False
+        self._dependents   = None
+
+        self._index = index.TaskIndex(self._pending_tasks, self._ids_rev, self._text_index)
+
+    def _graph_load(self):
+        """
+        Compute the fields of the pending tasks that depend on other tasks.
+        This needs the dependencies of all the pending tasks, so it reads
+        every task file not loaded yet.
+        """
+        if self._graph_loaded:
+            return
+
+        self._pending_data_load()
+
+        with profiling.span('graph'):
+            for task in self._pending_tasks.values():
+                task._graph_reset()
+
+            self._dependents = {}
+            for task in self._pending_tasks.values():
+                for dep in task.dependencies:
+                    self._dependents.setdefault(dep, set()).add(task.uuid)
+
+                    if dep in self._pending_tasks:
+                        self._pending_tasks[dep].dependents.add(task.uuid)
+                        self._pending_tasks[dep].blocking = True
+                        task.blocked = True
+
+        self._graph_loaded = True
+
+        now    = datetime.datetime.now(datetime.timezone.utc)
+        now_ts = now.timestamp()
+
+        with profiling.span('urgency'):
+            # reuse the cached urgency values that have not expired yet
+            self._urgency_expiry = {}
+            cache = self._urgency_cache or {}
+            stale = []
+            for task_uuid, task in self._pending_tasks.items():
+                cached = cache.get(task_uuid)
+                if cached is not None and now_ts < cached[1]:
+                    task.urgency, self._urgency_expiry[task_uuid] = cached
+                else:
+                    stale.append(task)
+            self._urgency_cache = None
+
+            # compute the rest at once, for the same time
+            self._urgency_compute(stale, now)
+
+        if self._snapshot_dirty:
+            self._snapshot_store()
+
+    def _urgency_compute(self, tasks, now):
+        """
+        Compute the urgency of the given pending tasks at once, for the time
+        now.
+        """
+        now_ts = now.timestamp()
+
+        for task, val in zip(tasks, self._urgency.tasks_urgency(tasks, self._index, now)):
+            task.urgency = val
+
+            expiry = self._urgency.urgency_expiry(task, now)
+            self._urgency_expiry[task.uuid] = expiry
+            # values that change continuously are not worth storing
+            if expiry > now_ts:
+                self._snapshot_dirty = True
+
+    def _snapshot_new(self):
+        """
+        Create an (empty) snapshot describing the current HEAD.
+        """
+        head = self._repo.head.peel()
+        tree = head.tree
+
+        tasks = str(tree['tasks'].id) if 'tasks' in tree else None
+
+        return snapshot.Snapshot(str(head.id), tasks, str(tree['pending'].id))
+
+    def _snapshot_load(self):
+        """
+        Fill the contents of the pending tasks from the stored snapshot, as
+        far as they are still valid.
+        """
+        self._snapshot_dirty = False
+
+        snap = snapshot.load(self._repo.path)
+        if snap is None:
+            return
+
+        cur = self._snapshot_new()
+        if (snap.head == cur.head or
+            (snap.tasks == cur.tasks and snap.pending == cur.pending)):
+            for task_uuid, task in self._pending_tasks.items():
+                if task_uuid in snap.tasks_data:
+                    task._data = snap.tasks_data[task_uuid][1]
+
+            # the urgency also depends on the factors
+            if snap.urgency is not None and snap.urgency_key == self._urgency.key():
+                self._urgency_cache = snap.urgency
+            return
+
+        # the tasks changed since the snapshot was made, so only reuse the
+        # contents of those tasks whose blobs are still the same
+        if cur.tasks is None:
+            return
+        tree = self._repo.head.peel().tree['tasks']
+
+        for task_uuid, task in self._pending_tasks.items():
+            if not task_uuid in snap.tasks_data:
+                continue
+            oid, data = snap.tasks_data[task_uuid]
+            try:
+                if str(tree[task_uuid].id) == oid:
+                    task._data = data
+            except KeyError:
+                pass
+
+    @profiling.spanned('snapshot.store')
+    def _snapshot_store(self):
+        """
+        Store the contents of the loaded pending tasks in the snapshot.
+        """
+        snap = self._snapshot_new()
+        snap.tasks_data = {}
+
+        if snap.tasks is not None:
+            tree = self._repo.head.peel().tree['tasks']
+
+            for task_uuid, task in self._pending_tasks.items():
+                if task._data is None:
+                    continue
+                try:
+                    snap.tasks_data[task_uuid] = (str(tree[task_uuid].id), task._data)
+                except KeyError:
+                    pass
+
+        if self._graph_loaded:
+            snap.urgency     = { u : (t.urgency, self._urgency_expiry[u])
+                                 for u, t in self._pending_tasks.items() }
+            snap.urgency_key = self._urgency.key()
+
+        snapshot.store(self._repo.path, snap)
+
+        self._snapshot_dirty = False
+
+    def _pending_unlink(self, task, touched):
+        """
+        Drop the links between a task that is no longer pending (in its old
+        form) and the tasks it depends on.
+        """
+        for dep in task.dependencies:
+            dependents = self._dependents.get(dep)
+            if dependents is not None:
+                dependents.discard(task.uuid)
+                if not dependents:
+                    del self._dependents[dep]
+
+            if dep in self._pending_tasks:
+                dep_task = self._pending_tasks[dep]
+                if task.uuid in dep_task.dependents:
+                    del dep_task.dependents[task.uuid]
+                dep_task.blocking = len(dep_task.dependents) > 0
+                touched.add(dep)
+
+    def _pending_link(self, task, touched):
+        """
+        Link a newly loaded pending task with the tasks it depends on and the
+        pending tasks that depend on it.
+        """
+        task._graph_reset()
+
+        for dep in task.dependencies:
+            self._dependents.setdefault(dep, set()).add(task.uuid)
 
-        for task in self._pending_tasks.values():
-            self._calc_urgency(task)
+            if dep in self._pending:
+                task.blocked = True
+
+            if dep in self._pending_tasks:
+                dep_task = self._pending_tasks[dep]
+                if not task.uuid in dep_task.dependents:
+                    dep_task.dependents.add(task.uuid)
+                dep_task.blocking = True
+                touched.add(dep)
+
+        for dependent in self._dependents.get(task.uuid, ()):
+            task.dependents.add(dependent)
+        task.blocking = len(task.dependents) > 0
+
+        touched.add(task.uuid)
+
+    def _pending_update(self, task_uuid, data = None):
+        """
+        Update the loaded pending tasks after the task with the given UUID was
+        written or deleted. Only the task itself and its direct neighbours in
+        the dependency graph are touched. data is the new unpacked task file
+        contents, if known.
+        """
+        touched = set()
+
+        # the cached values are only valid for the unmodified state
+        self._urgency_cache = None
+
+        old = self._pending_tasks.pop(task_uuid, None)
+        if old is not None:
+            self._index.task_remove(old)
+            if self._graph_loaded:
+                self._pending_unlink(old, touched)
+                del self._urgency_expiry[task_uuid]
+
+        if task_uuid in self._pending:
+            self._pending_tasks[task_uuid] = self._task_load(task_uuid, data)
+            self._index.task_add(self._pending_tasks[task_uuid])
+            if self._graph_loaded:
+                self._pending_link(self._pending_tasks[task_uuid], touched)
+
+        # the other tasks will be updated whenever the graph is loaded
+        if not self._graph_loaded:
+            return
+
+        # the pending status of this task might have changed, which affects
+        # the tasks depending on it
+        for dependent in self._dependents.get(task_uuid, ()):
+            dep_task = self._pending_tasks[dependent]
+            dep_task.blocked = False
+            for dep in dep_task.dependencies:
+                if dep in self._pending:
+                    dep_task.blocked = True
+                    break
+            touched.add(dependent)
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for touched_uuid in touched:
+            if touched_uuid in self._pending_tasks:
+                self._calc_urgency(self._pending_tasks[touched_uuid], now)
 
     def _load_short_ids(self):
         with open(os.path.join(self._path, 'ids'), 'r') as ids_file:
-            self._ids = {}
+            self._ids     = {}
+            self._ids_rev = {}
             i = 0
             for line in ids_file:
                 uuid = line.strip()
-                self._ids[uuid] = i
+                self._ids[uuid]  = i
+                self._ids_rev[i] = uuid
                 i += 1
+            self._ids_len = i
 
     def _task_pack(self, t):
         data = collections.OrderedDict()
@@ -301,18 +691,10 @@ class _RepositoryState(_RepositoryStateBase):
 
         return data
 
-    def _task_write(self, task):
-        path = os.path.join(self._path, 'tasks', task.uuid)
-        path_tmp = path + '.tmp'
-
-        with open(path_tmp, 'wt', newline = '\n') as tmpfile:
-            data = self._task_pack(task);
-            json.dump(data, tmpfile, ensure_ascii = False, indent = 4)
-            tmpfile.flush()
-            os.fsync(tmpfile.fileno())
-        os.replace(path_tmp, path)
-
-        self._repo.index.add(os.path.relpath(path, self._path))
+    def _task_write(self, task, txn):
+        data = self._task_pack(task)
+        txn.write(os.path.join('tasks', task.uuid),
+                  json.dumps(data, ensure_ascii = False, indent = 4))
 
         if task.completed == (task.uuid in self._pending):
             if task.uuid in self._pending:
@@ -320,73 +702,231 @@ class _RepositoryState(_RepositoryStateBase):
             else:
                 self._pending.add(task.uuid)
 
-                with open(os.path.join(self._path, 'ids'), 'ta', newline = '\n') as ids_file:
-                    ids_file.write('%s\n' % task.uuid)
-                    ids_file.flush()
-                    os.fsync(ids_file.fileno())
-                    self._repo.index.add('ids')
+                txn.append('ids', '%s\n' % task.uuid)
 
-            self._repo.index.add(os.path.relpath(self._pending.path, self._path))
-            self._reload_pending_tasks()
+                self._ids[task.uuid]         = self._ids_len
+                self._ids_rev[self._ids_len] = task.uuid
+                self._ids_len += 1
+
+        if task.uuid in self._pending or task.uuid in self._pending_tasks:
+            self._pending_update(task.uuid, data)
+
+        if self._text_index is not None:
+            self._text_index.task_update(task.uuid, task.text)
 
-        self._repo.index.write()
         self._commit_msgs.append('Update task %s' % task.uuid)
 
-    def _task_delete(self, task_uuid):
+    def _task_delete(self, task_uuid, txn):
         task_path = os.path.join(self._path, 'tasks', task_uuid)
         if not os.path.isfile(task_path):
             raise KeyError
 
-        os.remove(task_path)
-        self._repo.index.remove(os.path.join('tasks', task_uuid))
+        txn.delete(os.path.join('tasks', task_uuid))
 
         if task_uuid in self._pending:
             del self._pending[task_uuid]
-            self._repo.index.add(os.path.relpath(self._pending.path, self._path))
-            self._reload_pending_tasks()
+            self._pending_update(task_uuid)
+
+        if self._text_index is not None:
+            self._text_index.task_update(task_uuid, None)
 
-        self._repo.index.write()
         self._commit_msgs.append('Delete task %s' % task_uuid)
 
+    @profiling.spanned('modify')
     def modify(self, mod_list, commit_title):
         if self._modified:
             raise RepositoryStateModifiedError
 
+        txn = transaction.Transaction(self._path)
+
         for mod in mod_list:
             if isinstance(mod, TaskWrite):
-                self._task_write(mod.task)
+                self._task_write(mod.task, txn)
             elif isinstance(mod, TaskDelete):
-                self._task_delete(mod.uuid)
+                self._task_delete(mod.uuid, txn)
             else:
                 raise TypeError('Unknown repository modification type: %s' % mod)
 
-        self._commit_changes(commit_title)
+        # changes to the pending list are written out once for the whole
+        # modification, after all the task files
+        self._pending.write(txn)
+
+        self._commit_changes(txn, commit_title)
+
+        # the loaded tasks were kept up to date, so the next load can start
+        # from them
+        self._snapshot_store()
+        if self._text_index is not None:
+            self._text_index.store()
 
         self._modified = True
 
-    def _task_list(self):
+    def modified(self):
+        """
+        Check whether modify() was called on this state, after which it
+        cannot be used anymore and the repository must be loaded again.
+        """
+        return self._modified
+
+    def urgency_refresh(self):
+        """
+        Recompute the urgency values that expired since they were computed.
+        """
+        if self._modified:
+            raise RepositoryStateModifiedError
+
+        if not self._graph_loaded:
+            return
+
+        now    = datetime.datetime.now(datetime.timezone.utc)
+        now_ts = now.timestamp()
+
+        stale = [task for task_uuid, task in self._pending_tasks.items()
+                 if self._urgency_expiry[task_uuid] <= now_ts]
+        if stale:
+            with profiling.span('urgency'):
+                self._urgency_compute(stale, now)
+
+    def urgency_next_change(self):
+        """
+        Get the earliest time at which the urgency of any pending task will
+        change as an aware UTC datetime, None if it never changes.
+        """
+        if self._modified:
+            raise RepositoryStateModifiedError
+
+        self._graph_load()
+
+        ts = min(self._urgency_expiry.values(), default = math.inf)
+        if ts == math.inf:
+            return None
+        return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+
+    def tags(self):
+        """
+        Get a sorted list of (tag, number of tasks) for all the tags of the
+        pending tasks, including the parents of hierarchical tags.
+        """
+        if self._modified:
+            raise RepositoryStateModifiedError
+
+        return self._index.tag_counts()
+
+    def _tasks_scan_chunk(self, tasks_dir, chunk):
         ret = []
-        for f in os.listdir(os.path.join(self._path, 'tasks')):
+        for task_uuid in chunk:
+            with open(os.path.join(tasks_dir, task_uuid), 'rt') as task_fp:
+                data = json.load(task_fp)
+            ret.append(self._task_load(task_uuid, data))
+        return ret
+
+    def _tasks_scan(self, chunk_size = 256):
+        """
+        Iterate over the completed tasks, in the order of the task files in
+        their directory, reading them in chunks of chunk_size.
+        """
+        tasks_dir = os.path.join(self._path, 'tasks')
+
+        chunk = []
+        with os.scandir(tasks_dir) as it:
+            for entry in it:
+                if entry.name in self._pending:
+                    continue
+                try:
+                    uuid.UUID(entry.name)
+                except ValueError:
+                    continue
+
+                chunk.append(entry.name)
+                if len(chunk) >= chunk_size:
+                    yield from self._tasks_scan_chunk(tasks_dir, chunk)
+                    chunk = []
+
+        yield from self._tasks_scan_chunk(tasks_dir, chunk)
+
+    def _tasks_completed_load(self, task_uuids, chunk_size = 256):
+        """
+        Iterate over the completed tasks with the given UUIDs, in the order of
+        the UUIDs. UUIDs of pending or non-existent tasks are skipped.
+        """
+        tasks_dir = os.path.join(self._path, 'tasks')
+
+        chunk = []
+        for task_uuid in sorted(task_uuids):
+            if task_uuid in self._pending:
+                continue
             try:
-                u = uuid.UUID(f)
-                ret.append(f)
+                uuid.UUID(task_uuid)
             except ValueError:
-                pass
-        return ret
+                continue
+            if not os.path.isfile(os.path.join(tasks_dir, task_uuid)):
+                continue
+
+            chunk.append(task_uuid)
+            if len(chunk) >= chunk_size:
+                yield from self._tasks_scan_chunk(tasks_dir, chunk)
+                chunk = []
+
+        yield from self._tasks_scan_chunk(tasks_dir, chunk)
+
+    def _tasks_filter_gen(self, f):
+        match = f.matcher()
+
+        # only check the tasks the index says can match, if it can tell
+        candidates = f.candidates(self._index)
+        if candidates is None:
+            uuids = self._pending
+            # every task will be looked at, so read them all at once
+            if not f.empty():
+                self._pending_data_load()
+        else:
+            uuids = [u for u in candidates if u in self._pending_tasks]
+            uuids.sort(key = self._pending.position)
+
+        for task_uuid in uuids:
+            t = self._pending_tasks[task_uuid]
+            if match(t):
+                yield t
 
-    def tasks_filter(self, filter_args):
+        if f.match_completed():
+            candidates = f.candidates(self._index, completed = True)
+            if candidates is None:
+                completed = self._tasks_scan()
+            else:
+                completed = self._tasks_completed_load(candidates)
+
+            for t in completed:
+                if match(t):
+                    yield t
+
+    def tasks_filter_iter(self, filter_args):
+        """
+        Iterate over the tasks matching the filter. The pending tasks come
+        first, in the order they were added. If the filter can match completed
+        tasks, they follow in no particular order, read from disk as the
+        iteration proceeds.
+        """
         if self._modified:
             raise RepositoryStateModifiedError
 
-        f = task_filter.TaskFilter(filter_args)
+        return self._tasks_filter_gen(task_filter.TaskFilter(filter_args))
 
-        ret = []
-        for task_uuid in self._pending:
-            t = self._pending_tasks[task_uuid]
-            if f.task_match(t):
-                ret.append(t)
-        return ret
+    def tasks_filter(self, filter_args):
+        """
+        Get the list of tasks matching the filter. The pending tasks come
+        first, in the order they were added, then the completed tasks in the
+        order they were completed.
+        """
+        with profiling.span('filter'):
+            ret = list(self.tasks_filter_iter(filter_args))
+
+        pending_count = 0
+        while pending_count < len(ret) and not ret[pending_count].completed:
+            pending_count += 1
+        if pending_count < len(ret):
+            ret[pending_count:] = sorted(ret[pending_count:], key = _completed_sort_key)
 
+        return ret
 
 def init(path):
     """
@@ -0,0 +1,79 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A cache of the pending tasks contents, stored inside the git directory.
+"""
+
+import os
+import pickle
+
+from ..utils import pickle_file
+
+SNAPSHOT_VERSION = 2
+
+SNAPSHOT_NAME = 'td_snapshot'
+
+class Snapshot:
+    """OID of the HEAD commit the snapshot was created from"""
+    head    = None
+
+    """OID of the 'tasks' tree, None if there are no tasks"""
+    tasks   = None
+
+    """OID of the 'pending' blob"""
+    pending = None
+
+    """
+    a dict of { task uuid : (task blob OID, unpacked task file contents) }
+    for the pending tasks that were loaded
+    """
+    tasks_data = None
+
+    """
+    a dict of { task uuid : (urgency, expiry timestamp) } for the pending
+    tasks, None if not computed; urgency_key identifies the urgency factors
+    """
+    urgency     = None
+    urgency_key = None
+
+    def __init__(self, head, tasks, pending, tasks_data = None):
+        self.head    = head
+        self.tasks   = tasks
+        self.pending = pending
+
+        self.tasks_data = tasks_data
+
+def load(gitdir):
+    """
+    Read the snapshot stored in gitdir. Return None if there is no usable
+    snapshot.
+    """
+    try:
+        with open(os.path.join(gitdir, SNAPSHOT_NAME), 'rb') as f:
+            version, snapshot = pickle.load(f)
+    except Exception:
+        return None
+
+    if version != SNAPSHOT_VERSION or not isinstance(snapshot, Snapshot):
+        return None
+
+    return snapshot
+
+def store(gitdir, snapshot):
+    """
+    Atomically replace the snapshot stored in gitdir.
+    """
+    pickle_file.store(os.path.join(gitdir, SNAPSHOT_NAME), (SNAPSHOT_VERSION, snapshot))
@@ -0,0 +1,90 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Stamps of the state of the files managed by td in a repository working tree,
+computed from stat() data only, without pygit2.
+"""
+
+import json
+import os
+import os.path
+
+def head_read(gitdir):
+    """
+    Get the OID of the HEAD commit of the git repository in gitdir, reading
+    the refs directly. Return None if it cannot be determined.
+    """
+    try:
+        with open(os.path.join(gitdir, 'HEAD'), 'r') as f:
+            head = f.read().strip()
+
+        if not head.startswith('ref: '):
+            # detached HEAD
+            return head
+        ref = head[len('ref: '):]
+
+        try:
+            with open(os.path.join(gitdir, ref), 'r') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            pass
+
+        with open(os.path.join(gitdir, 'packed-refs'), 'r') as f:
+            for line in f:
+                if line.startswith(('#', '^')):
+                    continue
+                oid, name = line.split()
+                if name == ref:
+                    return oid
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+def files_stamp(repo_path):
+    """
+    Get a string identifying the state of the git index and the files and
+    directories td writes in the repository at repo_path.
+
+    Any change made through git or by adding, removing or replacing files
+    changes the stamp. The task files themselves are not looked at, so that
+    the stamp costs a few stat() calls regardless of the number of tasks; a
+    task file modified in place is only noticed by a full status scan.
+    """
+    stamp = []
+    for path in (os.path.join(repo_path, '.git', 'index'),
+                 os.path.join(repo_path, 'version'),
+                 os.path.join(repo_path, 'pending'),
+                 os.path.join(repo_path, 'ids'),
+                 os.path.join(repo_path, 'tasks')):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_ino, st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            stamp.append(None)
+    return repr(stamp)
+
+def repo_stamp(repo_path, head = None):
+    """
+    Get a string identifying the HEAD commit (given as a hex OID, or read from
+    the refs if None) and the files td writes in the repository at repo_path.
+    Return None if the HEAD cannot be determined.
+    """
+    if head is None:
+        head = head_read(os.path.join(repo_path, '.git'))
+        if head is None:
+            return None
+    return json.dumps([head, files_stamp(repo_path)])
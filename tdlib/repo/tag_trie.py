@@ -0,0 +1,103 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+class _TagNode:
+    """a dict of { tag component : _TagNode }"""
+    children = None
+
+    """
+    a dict of { task uuid : number of the task's tags equal to or under this
+    node }, its keys are the tasks matching the node's tag
+    """
+    tasks    = None
+
+    def __init__(self):
+        self.children = {}
+        self.tasks    = {}
+
+class TagTrie:
+    """
+    A map from tags to the tasks tagged with them, following the tag
+    hierarchy: a task tagged 'foo.bar.baz' is found under 'foo.bar.baz',
+    'foo.bar' and 'foo', even if no task has the latter two tags explicitly.
+    """
+
+    ### private ###
+    _root = None
+
+    def __init__(self):
+        self._root = _TagNode()
+
+    def _node(self, tag):
+        node = self._root
+        for comp in tag.split('.'):
+            node = node.children.get(comp)
+            if node is None:
+                return None
+        return node
+
+    def add(self, task_uuid, tag):
+        node = self._root
+        for comp in tag.split('.'):
+            if not comp in node.children:
+                node.children[comp] = _TagNode()
+            node = node.children[comp]
+            node.tasks[task_uuid] = node.tasks.get(task_uuid, 0) + 1
+
+    def remove(self, task_uuid, tag):
+        node  = self._root
+        nodes = []
+        for comp in tag.split('.'):
+            if not comp in node.children:
+                return
+            nodes.append((node, comp))
+            node = node.children[comp]
+
+        for parent, comp in nodes:
+            child = parent.children[comp]
+            count = child.tasks.get(task_uuid, 0)
+            if count <= 1:
+                child.tasks.pop(task_uuid, None)
+            else:
+                child.tasks[task_uuid] = count - 1
+
+            if not child.tasks:
+                del parent.children[comp]
+                break
+
+    def lookup(self, tag):
+        """
+        Get a set-like view of the UUIDs of the tasks tagged with tag or any
+        of its subtags.
+        """
+        node = self._node(tag)
+        if node is None:
+            return frozenset()
+        return node.tasks.keys()
+
+    def counts(self):
+        """
+        Get a list of (tag, number of tasks) for every tag in the trie,
+        including the implicit parent tags, sorted by tag.
+        """
+        ret = []
+        def walk(node, prefix):
+            for comp in sorted(node.children):
+                child = node.children[comp]
+                tag   = prefix + comp
+                ret.append((tag, len(child.tasks)))
+                walk(child, tag + '.')
+        walk(self._root, '')
+        return ret
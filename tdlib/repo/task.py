@@ -14,12 +14,12 @@
 # with td. If not, see <http://www.gnu.org/licenses/>.
 
 
-import datetime
-import dateutil
 import string
 import uuid
 import unicodedata
 
+from ..utils import dates
+
 class InvalidTagNameError(Exception):
     tag      = None
     charname = None
@@ -134,34 +134,112 @@ class _AbstractTask:
         self.dependencies = _Dependencies()
 
 
+class _LazyAttribute:
+    """
+    A task attribute that is computed by calling load(task) on first access.
+    The result is stored in the instance dict, so later accesses (and
+    assignments) do not go through the descriptor at all.
+    """
+    _load = None
+    _name = None
+
+    def __init__(self, load):
+        self._load = load
+
+    def __set_name__(self, owner, name):
+        self._name = name
+
+    def __get__(self, task, owner = None):
+        if task is None:
+            return self
+
+        val = self._load(task)
+        task.__dict__[self._name] = val
+        return val
+
+def _data_field(key, conv = None):
+    def load(task):
+        data = task._data_get()
+        if not key in data:
+            return None
+        return conv(data[key]) if conv is not None else data[key]
+    return _LazyAttribute(load)
+
+def _graph_field(name):
+    def load(task):
+        if task.completed:
+            # completed tasks are not part of the pending task graph
+            task._graph_reset()
+            task.blocked = any(dep in task._repo._pending for dep in task.dependencies)
+        else:
+            task._repo._graph_load()
+        return task.__dict__[name]
+    return _LazyAttribute(load)
+
 class RepositoryTask(_AbstractTask):
+    """
+    A task loaded from a repository.
+
+    Only the task identity (UUID, short ID, completion status) is known on
+    creation. The task file is read and the individual fields are parsed
+    when they are first accessed. The fields depending on other tasks
+    (blocked, blocking, dependents, urgency) are computed for all the pending
+    tasks at once, when any of them is first accessed. Completed tasks have
+    no dependents and no urgency.
+    """
+
     # task short ID (non-negative integer), None if not assigned
     id = None
 
+    text           = _data_field('text')
+    tags           = _LazyAttribute(lambda task: _Tags(task._data_get().get('tags', ())))
+    dependencies   = _LazyAttribute(lambda task: _Dependencies(task._data_get().get('depends', ())))
+    tw_extra       = _data_field('tw_extra')
+    date_created   = _data_field('date_created',   dates.parse)
+    date_completed = _data_field('date_completed', dates.parse)
+    date_due       = _data_field('date_due',       dates.parse)
+    date_scheduled = _data_field('date_scheduled', dates.parse)
+
     # the task depends on at least one other uncompleted task
-    blocked = None
+    blocked = _graph_field('blocked')
 
     # at least one other task depends on this one
-    blocking = None
+    blocking = _graph_field('blocking')
 
     # a set of tasks that depend on this one
-    dependents = None
+    dependents = _graph_field('dependents')
 
-    urgency = None
+    urgency = _graph_field('urgency')
 
     ### private ###
     "the repository the task is attached to"
     _repo = None
 
-    def __init__(self, repo):
-        super().__init__()
+    "the unpacked task file contents, None if not loaded yet"
+    _data = None
 
+    def __init__(self, repo, task_uuid, completed, data = None):
         self._repo = repo
 
-        self.dependents = _Dependencies()
+        self.uuid      = task_uuid
+        self.completed = completed
+
+        self._data = data
 
-        self.blocked  = False
-        self.blocking = False
+    def _data_get(self):
+        if self._data is None:
+            self._data = self._repo._task_data_load(self.uuid)
+        return self._data
+
+    def _graph_reset(self):
+        """
+        Reset the fields depending on other tasks to the values for a task
+        with no pending dependencies or dependents.
+        """
+        self.blocked    = False
+        self.blocking   = False
+        self.dependents = _Dependencies()
+        self.urgency    = None
 
 
 class StandaloneTask(_AbstractTask):
@@ -229,13 +307,13 @@ class TaskModification:
                 elif it == 'dep':
                     self._mod.append((self._MOD_DEP_SET, self._parse_deps(val)))
                 elif it == 'created':
-                    ts = self._parse_date(val)
+                    ts = dates.parse_user(val)
                     self._mod.append((self._MOD_CREATED, ts))
                 elif it == 'due':
-                    ts = self._parse_date(val)
+                    ts = dates.parse_user(val)
                     self._mod.append((self._MOD_DUE, ts))
                 elif it == 'scheduled':
-                    ts = self._parse_date(val)
+                    ts = dates.parse_user(val)
                     self._mod.append((self._MOD_SCHEDULED, ts))
 
     def _parse_deps(self, deps):
@@ -256,12 +334,6 @@ class TaskModification:
 
         return tasks[0].uuid
 
-    def _parse_date(self, datestr):
-        date = dateutil.parser.parse(datestr)
-        if date.tzinfo is None:
-            date = date.replace(tzinfo = dateutil.tz.tzlocal())
-        return date.astimezone(datetime.timezone.utc)
-
     def modify(self, task_orig):
         task = StandaloneTask(parent = task_orig)
 
@@ -0,0 +1,279 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+An index of the trigrams of the casefolded texts of all the tasks in the
+repository, both pending and completed, stored inside the git directory.
+"""
+
+import array
+import json
+import os
+import pickle
+import pygit2
+
+from ..utils import pickle_file
+
+TEXT_INDEX_VERSION = 1
+
+TEXT_INDEX_NAME = 'td_text_index'
+
+def _trigrams(text):
+    return { text[i:i + 3] for i in range(len(text) - 2) }
+
+class TextIndex:
+    """
+    The text index of a repository, loaded on first use.
+
+    task_update() must be called for every task written or deleted, store()
+    after the changes are committed.
+    """
+
+    ### private ###
+    """the pygit2 Repository"""
+    _repo  = None
+
+    """
+    a list of task UUIDs, indexed by task position; the positions of removed
+    tasks contain None; None if not loaded
+    """
+    _uuids = None
+
+    """a dict of { task uuid : position }, None if not built yet"""
+    _pos   = None
+
+    """
+    a dict of { trigram : set of task positions, or the same as a packed
+    array of unsigned ints }
+    """
+    _grams = None
+
+    """
+    a dict of { task uuid : casefolded task text } for the tasks with text,
+    None if not unpacked from _texts_packed yet
+    """
+    _texts        = None
+    _texts_packed = None
+
+    def __init__(self, repo):
+        self._repo = repo
+
+    def _path(self):
+        return os.path.join(self._repo.path, TEXT_INDEX_NAME)
+
+    def _tasks_tree(self, commit):
+        tree = commit.tree
+        return tree['tasks'] if 'tasks' in tree else None
+
+    def _postings(self, gram):
+        """
+        Get the set of positions of the tasks containing gram, unpacking it if
+        needed.
+        """
+        tasks = self._grams.get(gram)
+        if isinstance(tasks, bytes):
+            a = array.array('I')
+            a.frombytes(tasks)
+            tasks = set(a)
+            self._grams[gram] = tasks
+        return tasks
+
+    def _prepare_update(self):
+        if self._pos is None:
+            self._pos = { u : i for i, u in enumerate(self._uuids) if u is not None }
+        if self._texts is None:
+            self._texts = pickle.loads(self._texts_packed)
+            self._texts_packed = None
+
+    def _add(self, task_uuid, text):
+        pos = len(self._uuids)
+        self._uuids.append(task_uuid)
+        self._pos[task_uuid] = pos
+
+        self._texts[task_uuid] = text
+        for gram in _trigrams(text):
+            tasks = self._postings(gram)
+            if tasks is None:
+                tasks = self._grams[gram] = set()
+            tasks.add(pos)
+
+    def _remove(self, task_uuid):
+        text = self._texts.pop(task_uuid, None)
+        if text is None:
+            return
+
+        pos = self._pos.pop(task_uuid)
+        self._uuids[pos] = None
+
+        for gram in _trigrams(text):
+            tasks = self._postings(gram)
+            tasks.discard(pos)
+            if not tasks:
+                del self._grams[gram]
+
+    def _update_blob(self, task_uuid, oid):
+        self._remove(task_uuid)
+
+        text = json.loads(self._repo[oid].data.decode('utf-8')).get('text')
+        if text is not None:
+            self._add(task_uuid, text.casefold())
+
+    def _update(self, old_tree, new_tree):
+        """
+        Apply the changes between two 'tasks' trees to the loaded index. If
+        old_tree is None, build the index from new_tree.
+        """
+        if old_tree is None:
+            self._uuids = []
+            self._pos   = {}
+            self._grams = {}
+            self._texts = {}
+            self._texts_packed = None
+
+            if new_tree is not None:
+                for entry in new_tree:
+                    self._update_blob(entry.name, entry.id)
+            return
+
+        self._prepare_update()
+
+        if new_tree is None:
+            for task_uuid in list(self._texts):
+                self._remove(task_uuid)
+            return
+
+        for delta in old_tree.diff_to_tree(new_tree).deltas:
+            if delta.status == pygit2.GIT_DELTA_DELETED:
+                self._remove(delta.old_file.path)
+            else:
+                self._update_blob(delta.new_file.path, delta.new_file.id)
+
+    def _stored_load(self):
+        """
+        Read the stored index. Return the OID of the commit it was built from
+        or None if there is no usable stored index.
+        """
+        try:
+            with open(self._path(), 'rb') as f:
+                version, head, uuids, grams, texts_packed = pickle.load(f)
+        except Exception:
+            return None
+
+        if version != TEXT_INDEX_VERSION:
+            return None
+
+        self._uuids        = uuids
+        self._grams        = grams
+        self._texts_packed = texts_packed
+        return head
+
+    def _load(self):
+        if self._uuids is not None:
+            return
+
+        head = self._repo.head.peel()
+
+        stored_head = self._stored_load()
+        if stored_head == str(head.id):
+            return
+
+        old_tree = None
+        if stored_head is not None:
+            try:
+                old_tree = self._tasks_tree(self._repo[stored_head])
+            except (KeyError, ValueError):
+                # the commit is gone, e.g. the history was rewritten
+                pass
+
+        self._update(old_tree, self._tasks_tree(head))
+
+        self.store()
+
+    def lookup(self, string):
+        """
+        Get the set of UUIDs of the tasks whose text may contain string,
+        ignoring case. Return None if the string is too short to be looked
+        up.
+        """
+        grams = _trigrams(string.casefold())
+        if not grams:
+            return None
+
+        self._load()
+
+        sets = [self._postings(gram) or set() for gram in grams]
+        sets.sort(key = len)
+
+        uuids = self._uuids
+        return { uuids[pos] for pos in sets[0].intersection(*sets[1:]) }
+
+    def task_update(self, task_uuid, text):
+        """
+        Update the index after the text of the given task changed, text is
+        None for a deleted task or a task without text.
+        """
+        if self._uuids is None:
+            # the changes will be picked up from the commit when loading
+            return
+
+        self._prepare_update()
+
+        self._remove(task_uuid)
+        if text is not None:
+            self._add(task_uuid, text.casefold())
+
+    def _compact(self):
+        """
+        Drop the positions of removed tasks, if they make up a significant
+        part of the index.
+        """
+        if len(self._pos) * 2 >= len(self._uuids):
+            return
+
+        renumber = {}
+        uuids    = []
+        for pos, task_uuid in enumerate(self._uuids):
+            if task_uuid is not None:
+                renumber[pos] = len(uuids)
+                uuids.append(task_uuid)
+
+        for gram in list(self._grams):
+            self._grams[gram] = { renumber[pos] for pos in self._postings(gram) }
+
+        self._uuids = uuids
+        self._pos   = { u : i for i, u in enumerate(uuids) }
+
+    def store(self):
+        """
+        Atomically replace the stored index with the loaded one, if any.
+        """
+        if self._uuids is None:
+            return
+
+        if self._pos is not None:
+            self._compact()
+
+        grams = {}
+        for gram, tasks in self._grams.items():
+            if not isinstance(tasks, bytes):
+                tasks = array.array('I', sorted(tasks)).tobytes()
+            grams[gram] = tasks
+
+        texts_packed = self._texts_packed
+        if texts_packed is None:
+            texts_packed = pickle.dumps(self._texts, protocol = pickle.HIGHEST_PROTOCOL)
+
+        head = str(self._repo.head.target)
+        pickle_file.store(self._path(), (TEXT_INDEX_VERSION, head, self._uuids, grams, texts_packed))
@@ -0,0 +1,190 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import os.path
+import pygit2
+
+class Transaction:
+    """
+    A batch of changes to the files in the repository working tree, applied
+    together by write_files(). write_tree() then builds the tree to commit
+    directly from the parent commit tree and write_index() finally records
+    the changes in the index.
+
+    Every file is still replaced atomically with fully synced contents, same
+    as when writing them one by one. But all the files are written before any
+    of them is synced, which lets the kernel write them back together instead
+    of waiting for the disk once per file. The git index is updated in memory
+    and written out only once.
+
+    Updating the index still costs time linear in the number of files in the
+    repository, since it is read and written out as a whole, see
+    write_index().
+    """
+
+    """path to the repository root"""
+    path = None
+
+    ### private ###
+    """a dict of { path relative to root : new file contents }"""
+    _writes  = None
+
+    """a dict of { path relative to root : data to append }"""
+    _appends = None
+
+    """paths relative to root to be removed, as keys of a dict"""
+    _deletes = None
+
+    def __init__(self, path):
+        self.path     = path
+
+        self._writes  = {}
+        self._appends = {}
+        self._deletes = {}
+
+    def __len__(self):
+        return len(self._writes) + len(self._appends) + len(self._deletes)
+
+    def write(self, relpath, data):
+        self._deletes.pop(relpath, None)
+        self._writes[relpath] = data
+
+    def append(self, relpath, data):
+        self._appends[relpath] = self._appends.get(relpath, '') + data
+
+    def delete(self, relpath):
+        self._writes.pop(relpath, None)
+        self._deletes[relpath] = None
+
+    def _fsync_path(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def write_files(self):
+        """
+        Apply all the changes to the working tree.
+        """
+        # write out all the new contents to temporary files
+        for relpath, data in self._writes.items():
+            with open(os.path.join(self.path, relpath + '.tmp'), 'wt', newline = '\n') as tmpfile:
+                tmpfile.write(data)
+
+        # make sure they reach the disk before any of them is renamed into place
+        for relpath in self._writes:
+            self._fsync_path(os.path.join(self.path, relpath + '.tmp'))
+
+        for relpath, data in self._appends.items():
+            with open(os.path.join(self.path, relpath), 'ta', newline = '\n') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+        dirs = set()
+        for relpath in self._writes:
+            path = os.path.join(self.path, relpath)
+            os.replace(path + '.tmp', path)
+            dirs.add(os.path.dirname(path))
+
+        for relpath in self._deletes:
+            path = os.path.join(self.path, relpath)
+            os.remove(path)
+            dirs.add(os.path.dirname(path))
+
+        # persist the renames and removals
+        for d in dirs:
+            self._fsync_path(d)
+
+    def _tree_update(self, repo, tree, changes):
+        """
+        Apply changes -- a dict of { path relative to tree : blob OID or None
+        to remove } -- to the given tree, which may be None for an empty one.
+        Return the OID of the new tree or None if it is empty.
+
+        Only the trees containing changed entries are rebuilt, the rest is
+        reused as is.
+        """
+        builder = repo.TreeBuilder(tree) if tree is not None else repo.TreeBuilder()
+
+        subdirs = {}
+        for relpath, oid in changes.items():
+            if '/' in relpath:
+                name, rest = relpath.split('/', maxsplit = 1)
+                subdirs.setdefault(name, {})[rest] = oid
+            elif oid is None:
+                if builder.get(relpath) is not None:
+                    builder.remove(relpath)
+            else:
+                builder.insert(relpath, oid, pygit2.GIT_FILEMODE_BLOB)
+
+        for name, subchanges in subdirs.items():
+            subtree = tree[name] if tree is not None and name in tree else None
+
+            oid = self._tree_update(repo, subtree, subchanges)
+            if oid is not None:
+                builder.insert(name, oid, pygit2.GIT_FILEMODE_TREE)
+            elif builder.get(name) is not None:
+                builder.remove(name)
+
+        if not len(builder):
+            return None
+        return builder.write()
+
+    def write_tree(self, repo, parent_tree):
+        """
+        Write all the changed objects into the object database of the given
+        pygit2 Repository and return the OID of the tree obtained by applying
+        the changes to parent_tree. Must be called after write_files().
+        """
+        changes = {}
+        for relpath, data in self._writes.items():
+            changes[relpath] = repo.create_blob(data.encode('utf-8'))
+        for relpath in self._appends:
+            changes[relpath] = repo.create_blob_fromworkdir(relpath)
+        for relpath in self._deletes:
+            changes[relpath] = None
+
+        return self._tree_update(repo, parent_tree, changes)
+
+    def write_index(self, index):
+        """
+        Record all the changes in the given pygit2 Index and write it.
+
+        Only the changed entries are updated, but libgit2 has no way of
+        writing part of the index, so it is read (when first accessed) and
+        written out whole. For a repository with 20000 tasks that takes about
+        0.1 s, growing linearly with the number of tasks. It is still done on
+        every commit rather than deferred: until the index matches HEAD, git
+        itself sees the committed changes as staged reverts, which a plain
+        'git commit' by the user would then commit.
+        """
+        if not len(self):
+            return
+
+        for relpath in self._writes:
+            index.add(relpath)
+        for relpath in self._appends:
+            index.add(relpath)
+        for relpath in self._deletes:
+            index.remove(relpath)
+
+        index.write()
+
+        self._writes  = {}
+        self._appends = {}
+        self._deletes = {}
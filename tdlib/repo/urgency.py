@@ -0,0 +1,297 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Computation of the task urgency.
+
+The urgency of a task is the sum of the following terms, added in this
+order:
+    - the dependents factor times log2(1 + number of dependents)
+    - the blocked factor, if the task is blocked
+    - the scheduled term, ramping from scheduled_low to scheduled_high over
+      scheduled_activetime seconds up to the scheduled date
+    - the due term, ramping from 0 to due_high around the due date
+    - the weight of every configured tag the task is tagged with
+
+Only the scheduled and due terms depend on the time, and only while on their
+ramps.
+"""
+
+import math
+import sys
+
+"""
+Minimum number of tasks for which the NumPy implementation is used, for
+fewer tasks the overhead of building the arrays is not worth it.
+"""
+NUMPY_MIN_TASKS = 256
+
+def numpy_import():
+    """
+    Import numpy, if available, so that the batch computation uses it.
+
+    The import takes about 0.1 s, which the batch computation only makes up
+    for with tens of thousands of tasks. So it is only done by long-running
+    processes, such as the daemon.
+    """
+    try:
+        import numpy
+    except ImportError:
+        pass
+
+def numpy_get():
+    """
+    Get the numpy module if it was imported, None otherwise.
+    """
+    return sys.modules.get('numpy')
+
+def _next_change(now, points):
+    """
+    Get the first time after now at which a term changes, given the times
+    where its ramp starts and ends -- or a single time for a step. Return now
+    if the term is on its ramp, i.e. changes continuously.
+    """
+    if len(points) == 1:
+        return points[0] if now < points[0] else math.inf
+
+    start, end = min(points), max(points)
+    if now < start:
+        return start
+    if now < end:
+        return now
+    return math.inf
+
+class UrgencyEngine:
+    """
+    Computes the urgency of pending tasks with the factors from the given
+    'urgency.factors' config section. The factors are converted once, on
+    creation.
+
+    All the urgency values of one evaluation are computed for the same time,
+    passed as 'now' -- an aware datetime. The tasks must have the fields
+    depending on other tasks (blocked, dependents) set; the tags are looked up
+    in the given TaskIndex.
+
+    The batch computation gives exactly the same values as the computation
+    for a single task: the terms are computed with the same floating point
+    operations and added in the same order.
+    """
+
+    ### private ###
+    _dependents = None
+    _blocked    = None
+
+    _sched_high = None
+    _sched_low  = None
+    _sched_at   = None
+
+    _due_high   = None
+    _due_pre    = None
+    _due_post   = None
+
+    """a list of (tag, weight), in the config order"""
+    _tags       = None
+
+    """a list of log2(1 + n), extended as needed"""
+    _log2       = None
+
+    def __init__(self, factors):
+        self._dependents = float(factors.dependents)
+        self._blocked    = float(factors.blocked)
+
+        self._sched_high = float(factors.scheduled_high)
+        self._sched_low  = float(factors.scheduled_low)
+        self._sched_at   = int(factors.scheduled_activetime)
+
+        self._due_high   = float(factors.due_high)
+        self._due_pre    = int(factors.due_time_pre)
+        self._due_post   = int(factors.due_time_post)
+
+        # the tag names contain dots, so they are only available by key
+        self._tags = [(tag, float(weight)) for tag, weight in factors.tags.items()]
+
+        self._log2 = [0.0]
+
+    def _log2_get(self, count):
+        """
+        Get a list of log2(1 + n) for n in [0, count]. The values always come
+        from math.log2(), since NumPy's log2 may round differently.
+        """
+        for i in range(len(self._log2), count + 1):
+            self._log2.append(math.log2(1.0 + i))
+        return self._log2
+
+    def _scheduled(self, delta):
+        high = self._sched_high
+        low  = self._sched_low
+        at   = self._sched_at
+
+        if at != 0:
+            slope = (high - low) / at
+            return max(low, min(high, slope * delta + high))
+        return high if delta >= 0 else low
+
+    def _due(self, delta):
+        high = self._due_high
+        pre  = self._due_pre
+        post = self._due_post
+
+        if (pre + post) != 0:
+            # NOTE: this is not the slope of the ramp described in the config
+            # (that would be the inverse), kept so as not to change the
+            # urgency of existing tasks
+            slope  = (pre + post) / high
+            offset = pre * slope
+            return max(0.0, min(high, slope * delta + offset))
+        return high if delta >= 0 else 0.0
+
+    def key(self):
+        """
+        Get a value identifying the factors, for validating cached urgency
+        values.
+        """
+        return (self._dependents, self._blocked,
+                self._sched_high, self._sched_low, self._sched_at,
+                self._due_high, self._due_pre, self._due_post,
+                tuple(self._tags))
+
+    def urgency_expiry(self, task, now):
+        """
+        Get the POSIX timestamp until which the urgency of the task computed
+        at 'now' stays valid, math.inf if forever, now if it changes
+        continuously.
+        """
+        now = now.timestamp()
+        ret = math.inf
+
+        if task.date_scheduled is not None:
+            sched = task.date_scheduled.timestamp()
+            if self._sched_at != 0:
+                # low at activetime before the scheduled time, high from it on
+                points = (sched - self._sched_at, sched)
+            else:
+                points = (sched,)
+            ret = min(ret, _next_change(now, points))
+
+        if task.date_due is not None:
+            due  = task.date_due.timestamp()
+            high = self._due_high
+            pre  = self._due_pre
+            post = self._due_post
+            if (pre + post) != 0:
+                # the points where the (unclamped) term crosses 0 and high,
+                # derived from the same slope as in _due()
+                slope  = (pre + post) / high
+                offset = pre * slope
+                points = (due - offset / slope, due + (high - offset) / slope)
+            else:
+                points = (due,)
+            ret = min(ret, _next_change(now, points))
+
+        return ret
+
+    def task_urgency(self, task, index, now):
+        """
+        Compute the urgency of a single task.
+        """
+        val = 0.0
+
+        dependents = len(task.dependents)
+        val += self._dependents * self._log2_get(dependents)[dependents]
+
+        if task.blocked:
+            val += self._blocked
+
+        if task.date_scheduled is not None:
+            val += self._scheduled((now - task.date_scheduled).total_seconds())
+
+        if task.date_due is not None:
+            val += self._due((now - task.date_due).total_seconds())
+
+        # checked on the task itself, so that the tag index is only built
+        # for the queries needing it
+        for tag, weight in self._tags:
+            if tag in task.tags:
+                val += weight
+
+        return val
+
+    def _tasks_urgency_numpy(self, tasks, index, now):
+        numpy = numpy_get()
+        n     = len(tasks)
+
+        dependents = numpy.fromiter((len(t.dependents) for t in tasks), dtype = numpy.intp, count = n)
+        log2       = numpy.array(self._log2_get(int(dependents.max())))
+
+        val  = numpy.zeros(n)
+        val += self._dependents * log2[dependents]
+
+        blocked = numpy.fromiter((t.blocked for t in tasks), dtype = bool, count = n)
+        val[blocked] += self._blocked
+
+        # the offsets are computed in Python, since the timedelta arithmetic
+        # is exact, the rest is vectorized
+        sched = [(i, (now - t.date_scheduled).total_seconds())
+                 for i, t in enumerate(tasks) if t.date_scheduled is not None]
+        if sched:
+            idx, delta = map(numpy.array, zip(*sched))
+
+            high = self._sched_high
+            low  = self._sched_low
+            at   = self._sched_at
+            if at != 0:
+                slope = (high - low) / at
+                term  = numpy.maximum(low, numpy.minimum(high, slope * delta + high))
+            else:
+                term  = numpy.where(delta >= 0, high, low)
+            val[idx] += term
+
+        due = [(i, (now - t.date_due).total_seconds())
+               for i, t in enumerate(tasks) if t.date_due is not None]
+        if due:
+            idx, delta = map(numpy.array, zip(*due))
+
+            high = self._due_high
+            pre  = self._due_pre
+            post = self._due_post
+            if (pre + post) != 0:
+                slope  = (pre + post) / high
+                offset = pre * slope
+                term   = numpy.maximum(0.0, numpy.minimum(high, slope * delta + offset))
+            else:
+                term   = numpy.where(delta >= 0, high, 0.0)
+            val[idx] += term
+
+        # the tag weights matrix, one column at a time
+        for tag, weight in self._tags:
+            tagged = index.lookup_tags((tag,))
+            if not tagged:
+                continue
+            column = numpy.fromiter((t.uuid in tagged for t in tasks), dtype = bool, count = n)
+            val[column] += weight
+
+        return val.tolist()
+
+    def tasks_urgency(self, tasks, index, now):
+        """
+        Compute the urgency of all the tasks in the given list. Return a list
+        of the urgency values, in the same order.
+
+        Uses NumPy when it was imported and there are enough tasks, otherwise
+        the tasks are processed one by one.
+        """
+        if len(tasks) >= NUMPY_MIN_TASKS and numpy_get() is not None:
+            return self._tasks_urgency_numpy(tasks, index, now)
+        return [self.task_urgency(t, index, now) for t in tasks]
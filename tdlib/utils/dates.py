@@ -0,0 +1,78 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+# dateutil is only imported in the functions needing it, since importing it
+# takes a significant part of the startup time
+
+import datetime
+
+_utc = datetime.timezone.utc
+
+def parse(datestr):
+    """
+    Parse an ISO 8601 date string into an aware datetime object.
+
+    The canonical repository format -- YYYY-MM-DDTHH:mm:ss.ssssss+00:00, or
+    the same without the fractional part as written by datetime.isoformat()
+    when it is zero -- and the basic UTC format YYYYMMDDTHHmmssZ used by
+    Taskwarrior are decoded directly. Anything else is handed to the generic
+    (and much slower) dateutil parser.
+    """
+    l = len(datestr)
+
+    if (l == 32 or l == 25) and datestr[10] == 'T' and datestr.endswith('+00:00'):
+        try:
+            return datetime.datetime.fromisoformat(datestr)
+        except ValueError:
+            pass
+    elif (l == 16 and datestr[8] == 'T' and datestr[15] == 'Z' and
+          datestr[:8].isdigit() and datestr[9:15].isdigit()):
+        try:
+            return datetime.datetime(int(datestr[0:4]),   int(datestr[4:6]),   int(datestr[6:8]),
+                                     int(datestr[9:11]),  int(datestr[11:13]), int(datestr[13:15]),
+                                     tzinfo = _utc)
+        except ValueError:
+            pass
+
+    import dateutil.parser
+    return dateutil.parser.parse(datestr)
+
+def parse_user(datestr):
+    """
+    Parse a date given by the user on the command line. Dates without an
+    explicit timezone are in local time. Return an aware UTC datetime object.
+    """
+    import dateutil.parser
+    import dateutil.tz
+
+    date = dateutil.parser.parse(datestr)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo = dateutil.tz.tzlocal())
+    return date.astimezone(_utc)
+
+def local_day(date):
+    """
+    Get the bounds of the local calendar day containing the given aware
+    datetime, as a tuple of aware UTC datetimes (start, end). The start is
+    included in the day, the end is not.
+    """
+    import dateutil.tz
+
+    tz  = dateutil.tz.tzlocal()
+    day = date.astimezone(tz).date()
+
+    start = datetime.datetime.combine(day, datetime.time(), tzinfo = tz)
+    end   = datetime.datetime.combine(day + datetime.timedelta(days = 1), datetime.time(), tzinfo = tz)
+    return start.astimezone(_utc), end.astimezone(_utc)
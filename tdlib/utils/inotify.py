@@ -0,0 +1,126 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A minimal interface to the Linux inotify API, through ctypes.
+"""
+
+import ctypes
+import errno
+import os
+import struct
+
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+
+"""all the events changing the contents of a directory or its files"""
+IN_CHANGES = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC  = os.O_CLOEXEC
+
+_event_header = struct.Struct('iIII')
+
+class Inotify:
+    """
+    An inotify instance. Raises OSError on creation if inotify is not
+    available.
+
+    The file descriptor returned by fileno() is non-blocking and becomes
+    readable when events are pending, read() then returns them.
+    """
+
+    ### private ###
+    _libc    = None
+    _fd      = None
+
+    """a dict of { watch descriptor : watched path }"""
+    _watches = None
+
+    def __init__(self):
+        try:
+            # the C library is already loaded into the process
+            self._libc = ctypes.CDLL(None, use_errno = True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+
+        fd = init(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        self._fd      = fd
+        self._watches = {}
+
+    def watch(self, path, mask = IN_CHANGES):
+        """
+        Watch the file or directory at path for the given events.
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self._watches[wd] = path
+
+    def fileno(self):
+        return self._fd
+
+    def read(self):
+        """
+        Read all the pending events. Return a list of (watched path, event
+        mask, name), where name is the name of the file inside a watched
+        directory or None. A queue overflow is reported with path None.
+        """
+        data = b''
+        while True:
+            try:
+                chunk = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            data += chunk
+
+        events = []
+        offset = 0
+        while offset + _event_header.size <= len(data):
+            wd, mask, cookie, length = _event_header.unpack_from(data, offset)
+            offset += _event_header.size
+
+            name    = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            events.append((self._watches.get(wd), mask, os.fsdecode(name) if name else None))
+
+        return events
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
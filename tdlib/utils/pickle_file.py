@@ -0,0 +1,48 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Storage of the caches td keeps in files: the snapshot, the text index, the
+parsed config and the report output. They can always be rebuilt, so failing
+to write them is not an error.
+
+Every cache is stored with a version number, which is bumped whenever the
+layout of its data changes. A file with another version or one that cannot be
+read is treated as missing.
+"""
+
+import os
+import os.path
+import pickle
+
+def store(path, obj):
+    """
+    Atomically replace the file at path with obj pickled, creating its
+    directory if needed. Return False if that failed.
+    """
+    path_tmp = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with open(path_tmp, 'wb') as f:
+            pickle.dump(obj, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(path_tmp, path)
+    except OSError:
+        try:
+            os.remove(path_tmp)
+        except OSError:
+            pass
+        return False
+
+    return True
@@ -0,0 +1,182 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Timing of the phases of a td run, marked in the code with
+    with profiling.span('name'):
+        ...
+or with the spanned() decorator. Nothing is recorded unless enable() was
+called.
+"""
+
+import functools
+import time
+
+FORMATS = ('text', 'json')
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_null_span = _NullSpan()
+
+class _Node:
+    """
+    A position in the tree of spans.
+    """
+    name     = None
+    calls    = 0
+    total    = 0.0
+
+    """a dict of { name : _Node }, in the order they were first entered"""
+    children = None
+
+    def __init__(self, name):
+        self.name     = name
+        self.children = {}
+
+class _Span:
+    __slots__ = ('_profiler', '_name', '_start')
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name     = name
+
+    def __enter__(self):
+        stack = self._profiler.stack
+        node  = stack[-1].children.get(self._name)
+        if node is None:
+            node = stack[-1].children[self._name] = _Node(self._name)
+        stack.append(node)
+
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self._start
+
+        node = self._profiler.stack.pop()
+        node.calls += 1
+        node.total += elapsed
+        return False
+
+class _Profiler:
+    start = None
+    root  = None
+
+    """the nodes of the spans currently entered, starting with the root"""
+    stack = None
+
+    def __init__(self, start):
+        self.start = start
+        self.root  = _Node(None)
+        self.stack = [self.root]
+
+_profiler = None
+
+def enable(start = None):
+    """
+    Start recording the spans. start is the time (as returned by
+    time.perf_counter()) the run started at, if earlier than now; the time
+    until now is then recorded as the 'startup' span.
+    """
+    global _profiler
+
+    now = time.perf_counter()
+    _profiler = _Profiler(now if start is None else start)
+
+    if start is not None:
+        node = _profiler.root.children['startup'] = _Node('startup')
+        node.calls = 1
+        node.total = now - start
+
+def enabled():
+    return _profiler is not None
+
+def span(name):
+    """
+    Get a context manager recording the time spent in it as a span with the
+    given name.
+    """
+    if _profiler is None:
+        return _null_span
+    return _Span(_profiler, name)
+
+def spanned(name):
+    """
+    A decorator recording every call of the decorated function as a span
+    with the given name.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _Span(_profiler, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def results():
+    """
+    Get the recorded spans as a dict with the total time of the run, the list
+    of spans in depth-first order and the time not spent in any span.
+    """
+    total = time.perf_counter() - _profiler.start
+
+    spans = []
+    def walk(node, path, depth):
+        for child in node.children.values():
+            child_path = path + [child.name]
+            nested     = sum(c.total for c in child.children.values())
+            spans.append({
+                'name'  : child.name,
+                'path'  : '/'.join(child_path),
+                'depth' : depth,
+                'calls' : child.calls,
+                'total' : child.total,
+                'self'  : child.total - nested,
+            })
+            walk(child, child_path, depth + 1)
+    walk(_profiler.root, [], 0)
+
+    other = total - sum(c.total for c in _profiler.root.children.values())
+
+    return { 'total' : total, 'spans' : spans, 'other' : other }
+
+def report(out, format = 'text'):
+    """
+    Write the recorded spans to the given text stream, in one of FORMATS.
+    """
+    res = results()
+
+    if format == 'json':
+        import json
+
+        json.dump(res, out, indent = 4)
+        out.write('\n')
+        return
+
+    namew = max([len('phase')] + [2 * s['depth'] + len(s['name']) for s in res['spans']])
+
+    out.write('td profile: %.3f ms in total\n' % (res['total'] * 1000))
+    out.write('%-*s %6s %10s %10s\n' % (namew, 'phase', 'calls', 'total ms', 'self ms'))
+    for s in res['spans']:
+        out.write('%-*s %6d %10.3f %10.3f\n' % (namew, '  ' * s['depth'] + s['name'],
+                                               s['calls'], s['total'] * 1000, s['self'] * 1000))
+    out.write('%-*s %6s %10.3f\n' % (namew, '(other)', '', res['other'] * 1000))
@@ -0,0 +1,157 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A cache of the rendered output of reports, keyed by the stamp of the task
+repository and everything else the output depends on. Every entry has an
+expiry time, since the output also depends on the time.
+"""
+
+import datetime
+import hashlib
+import os
+import os.path
+import pickle
+import time
+
+from . import pickle_file
+
+REPORT_CACHE_VERSION = 3
+
+def local_midnight():
+    """
+    Get the POSIX timestamp of the next local midnight, when relative dates
+    (e.g. 'today') change their meaning.
+    """
+    tomorrow = datetime.date.today() + datetime.timedelta(days = 1)
+    return datetime.datetime.combine(tomorrow, datetime.time()).timestamp()
+
+def key_make(repo_stamp, *parts):
+    """
+    Build the cache key for the output of a command on the task repository in
+    the state identified by repo_stamp, parts are any further values with a
+    stable repr() the output depends on. Return None if repo_stamp is None.
+    """
+    if repo_stamp is None:
+        return None
+
+    key = repr((REPORT_CACHE_VERSION, repo_stamp, os.environ.get('TZ'), time.tzname) + parts)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+class OutputRecorder:
+    """
+    A wrapper around an output text stream, which records everything written
+    to it. The file descriptor is exposed, so terminal handling (e.g.
+    blessed) sees the wrapped stream.
+    """
+
+    ### private ###
+    _out    = None
+    _chunks = None
+
+    def __init__(self, out):
+        self._out    = out
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(data)
+        return self._out.write(data)
+
+    def flush(self):
+        self._out.flush()
+
+    def fileno(self):
+        return self._out.fileno()
+
+    def isatty(self):
+        return self._out.isatty()
+
+    def getvalue(self):
+        return ''.join(self._chunks)
+
+class ReportCache:
+    """
+    The cache stored in a directory, one file per entry. Storing an entry
+    removes the entries older than max_age seconds and the oldest ones over
+    max_size bytes in total.
+    """
+
+    ### private ###
+    _path     = None
+    _max_age  = None
+    _max_size = None
+
+    def __init__(self, path, max_age, max_size):
+        self._path     = path
+        self._max_age  = max_age
+        self._max_size = max_size
+
+    def _entry_path(self, key):
+        return os.path.join(self._path, key)
+
+    def lookup(self, key):
+        """
+        Get the output stored for the key, or None if there is no valid
+        entry.
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                version, expiry, output = pickle.load(f)
+        except Exception:
+            return None
+
+        if version != REPORT_CACHE_VERSION or time.time() >= expiry:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        return output
+
+    def _evict(self):
+        entries = []
+        try:
+            with os.scandir(self._path) as it:
+                for entry in it:
+                    if entry.is_file():
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            return
+
+        # newest first
+        entries.sort(reverse = True)
+
+        now  = time.time()
+        size = 0
+        for mtime, entry_size, path in entries:
+            size += entry_size
+            if now - mtime > self._max_age or size > self._max_size:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def store(self, key, output, expiry):
+        """
+        Store the output for the key, valid until expiry (a POSIX timestamp).
+        """
+        if expiry <= time.time():
+            return
+
+        if pickle_file.store(self._entry_path(key), (REPORT_CACHE_VERSION, expiry, output)):
+            self._evict()
@@ -15,19 +15,18 @@
 
 import blessed
 
-def report_print(config, out,
-                 tasks, columns, sort, col_sep):
-    # sort the task list
-    if sort.endswith('+'):
-        sort_reverse = False
-    elif sort.endswith('-'):
-        sort_reverse = True
-    else:
-        raise ValueError('Invalid sorting specification: %s' % sort)
-    sort = sort[:-1]
+from . import profiling, task_output
 
-    tasks = sorted(tasks, key = lambda task, sort = sort: getattr(task, sort),
-                   reverse = sort_reverse)
+@profiling.spanned('render')
+def report_print(config, out,
+                 tasks, columns, sort, col_sep, limit = None):
+    """
+    Print the tasks as a table. If limit is not None, only the first limit
+    tasks in the sort order are printed; those are selected without sorting
+    all the tasks and only they are formatted.
+    """
+    with profiling.span('sort'):
+        tasks = task_output.tasks_sort(tasks, sort, limit)
 
     # compute the required width for the header
     maxw = [0] * len(columns)
@@ -44,7 +43,10 @@ def report_print(config, out,
             # the value can be multi-line, so we split it to a list of lines
             # that will be joined later when we know the final width of
             # each column
-            col_val = str(getattr(t, col)).split('\n')
+            # missing values (e.g. the short ID of a completed task) are
+            # left empty
+            val     = getattr(t, col)
+            col_val = ('' if val is None else str(val)).split('\n')
             maxw[i] = max(maxw[i], *map(len, col_val))
             nb_lines = max(nb_lines, len(col_val))
             col_vals.append(col_val)
@@ -63,7 +65,7 @@ def report_print(config, out,
 
     # print the tasks
     alternate = False
-    alternate_format = getattr(term, 'on_' + config['colors.alternate_bg'])
+    alternate_format = getattr(term, 'on_' + config.colors.alternate_bg)
     for tf, nb_lines in tasks_formatted:
         format = alternate_format if alternate else lambda x: x
         for i in range(nb_lines):
@@ -0,0 +1,102 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Task list output that does not need a terminal: sorting and the
+machine-readable formats.
+
+The machine-readable formats write each task as soon as it is received,
+without looking at the other tasks, so they work on arbitrarily long
+iterators in constant memory:
+    - 'jsonl' -- one JSON object per line, with the fields as keys
+    - 'tsv'   -- a header line with the field names, then one line per task
+      with tab-separated values; tabs, newlines and backslashes in the values
+      are escaped as \\t, \\n and \\\\, lists are space-separated
+"""
+
+import datetime
+import heapq
+import json
+
+"""the output formats, 'table' is the (terminal) default"""
+FORMATS = ('table', 'jsonl', 'tsv')
+
+def tasks_sort(tasks, sort, limit = None):
+    """
+    Sort the tasks according to a sort specification: a task attribute name
+    followed by '+' for ascending or '-' for descending order. Tasks without
+    the attribute value go last.
+
+    If limit is not None, only the first limit tasks in the sort order are
+    returned; those are selected in O(n log limit) and tasks can be any
+    iterable, only limit tasks are kept in memory.
+    """
+    if sort.endswith('+'):
+        sort_reverse = False
+    elif sort.endswith('-'):
+        sort_reverse = True
+    else:
+        raise ValueError('Invalid sorting specification: %s' % sort)
+    sort = sort[:-1]
+
+    # tasks without the value (e.g. the short ID or urgency of completed
+    # tasks) always go last
+    def sort_key(task):
+        val = getattr(task, sort)
+        return ((val is None) != sort_reverse, val)
+
+    if limit is not None:
+        # same as sorted()[:limit]
+        select = heapq.nlargest if sort_reverse else heapq.nsmallest
+        return select(limit, tasks, key = sort_key)
+    return sorted(tasks, key = sort_key, reverse = sort_reverse)
+
+def _json_value(val):
+    if val is None or isinstance(val, (bool, int, float, str)):
+        return val
+    if isinstance(val, datetime.datetime):
+        return val.isoformat()
+    # tags, dependencies, dependents
+    return list(val)
+
+def _tsv_value(val):
+    if val is None:
+        return ''
+
+    if isinstance(val, datetime.datetime):
+        val = val.isoformat()
+    elif isinstance(val, (bool, int, float, str)):
+        val = str(val)
+    else:
+        val = ' '.join(val)
+
+    return val.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def tasks_write(out, format, tasks, fields):
+    """
+    Write the given task attributes of all the tasks from the tasks iterable
+    to out, in one of the machine-readable formats. Each task is written out
+    as soon as it is received.
+    """
+    if format == 'jsonl':
+        for task in tasks:
+            record = { field : _json_value(getattr(task, field)) for field in fields }
+            out.write(json.dumps(record, ensure_ascii = False) + '\n')
+    elif format == 'tsv':
+        out.write('\t'.join(fields) + '\n')
+        for task in tasks:
+            out.write('\t'.join(_tsv_value(getattr(task, field)) for field in fields) + '\n')
+    else:
+        raise ValueError('Invalid output format: %s' % format)
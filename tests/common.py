@@ -0,0 +1,102 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Helpers shared by the tests.
+"""
+
+import datetime
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from tdlib                     import config
+from tdlib.repo                import repository, snapshot, text_index
+from tdlib.repo.repository_mod import TaskWrite
+from tdlib.repo.task           import StandaloneTask
+
+def days(n):
+    """
+    Get the aware UTC datetime n days from now.
+    """
+    return datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days = n)
+
+def task_fields(task):
+    """
+    Get a tuple of the values of all the fields of a loaded task, for
+    comparing tasks loaded in different ways.
+    """
+    return (task.uuid, task.id, task.text, sorted(task.tags), sorted(task.dependencies),
+            task.completed, task.date_created, task.date_completed, task.date_due,
+            task.date_scheduled, task.blocked, task.blocking, sorted(task.dependents),
+            task.urgency)
+
+class RepositoryTestCase(unittest.TestCase):
+    """
+    A test case with a new empty td repository in a temporary directory,
+    using the default config.
+    """
+
+    """path to the repository root"""
+    path = None
+
+    """the Config"""
+    conf = None
+
+    """the Repository"""
+    repo = None
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp(prefix = 'td-test-')
+        self.addCleanup(shutil.rmtree, tmpdir)
+
+        self.path = os.path.join(tmpdir, 'repo')
+        repository.init(self.path)
+
+        self.conf = config.Config()
+        self.conf['repo_path'] = self.path
+        self.repo = repository.Repository(self.path, self.conf['lib'])
+
+    def task_make(self, text, tags = (), dependencies = (), **fields):
+        """
+        Create a new StandaloneTask, fields are any further task attributes.
+        """
+        t = StandaloneTask()
+        t.text         = text
+        t.date_created = days(-1)
+        for tag in tags:
+            t.tags.add(tag)
+        for dep in dependencies:
+            t.dependencies.add(dep)
+        for name, val in fields.items():
+            setattr(t, name, val)
+        return t
+
+    def tasks_write(self, tasks, commit_title = 'test'):
+        self.repo.load().modify([TaskWrite(t) for t in tasks], commit_title)
+
+    def load_fresh(self):
+        """
+        Load the repository state without any of the caches td keeps in the
+        git directory.
+        """
+        for name in (snapshot.SNAPSHOT_NAME, text_index.TEXT_INDEX_NAME):
+            try:
+                os.remove(os.path.join(self.path, '.git', name))
+            except FileNotFoundError:
+                pass
+        return repository.Repository(self.path, self.conf['lib'], paranoid = True).load()
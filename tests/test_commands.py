@@ -0,0 +1,77 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests of the command line parsing, run from the top-level source directory
+with
+    python3 -m unittest
+"""
+
+import unittest
+
+from tdlib import commands, config
+
+class FilterOptionsTest(unittest.TestCase):
+    """
+    The options of the commands taking a filter are accepted both before and
+    after it.
+    """
+
+    def _parse(self, *argv):
+        parser, cmds = commands.parser_create(config.Config(), 'td', argv[:1])
+        return parser.parse_args(argv)
+
+    def test_options_before_filter(self):
+        args = self._parse('list', '--limit', '5', '-f', 'jsonl', '+tag', 'and', 'text:x')
+        self.assertEqual(args.filter, ['+tag', 'and', 'text:x'])
+        self.assertEqual(args.limit, 5)
+        self.assertEqual(args.format, 'jsonl')
+
+    def test_options_after_filter(self):
+        args = self._parse('list', '+tag', '--limit', '5')
+        self.assertEqual(args.filter, ['+tag'])
+        self.assertEqual(args.limit, 5)
+
+        args = self._parse('list', '+tag', '-l5', '--format=tsv')
+        self.assertEqual(args.filter, ['+tag'])
+        self.assertEqual(args.limit, 5)
+        self.assertEqual(args.format, 'tsv')
+
+        args = self._parse('show', '3', '-f', 'jsonl')
+        self.assertEqual(args.filter, ['3'])
+        self.assertEqual(args.format, 'jsonl')
+
+    def test_options_inside_filter(self):
+        args = self._parse('list', '+a', '-l', '5', 'or', '+b')
+        self.assertEqual(args.filter, ['+a', 'or', '+b'])
+        self.assertEqual(args.limit, 5)
+
+    def test_separator(self):
+        args = self._parse('list', '-l', '3', '--', 'text:x', '--limit', '5')
+        self.assertEqual(args.filter, ['text:x', '--limit', '5'])
+        self.assertEqual(args.limit, 3)
+
+        args = self._parse('list', 'text:x', '--', '-l')
+        self.assertEqual(args.filter, ['text:x', '-l'])
+        self.assertIsNone(args.limit)
+
+    def test_dash_words(self):
+        # words starting with '-' that are not options stay in the filter
+        args = self._parse('list', '-5', 'text:-x')
+        self.assertEqual(args.filter, ['-5', 'text:-x'])
+        self.assertIsNone(args.limit)
+
+if __name__ == '__main__':
+    unittest.main()
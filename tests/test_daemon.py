@@ -0,0 +1,108 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests of the td daemon, run from the top-level source directory with
+    python3 -m unittest
+"""
+
+import json
+import os
+import socket
+import unittest
+
+from tdlib import config, daemon
+
+from .common import RepositoryTestCase
+
+class RequestTest(RepositoryTestCase):
+    """
+    The daemon runs the commands of clients with the same config and
+    environment, and refuses the others without running anything.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        self.tasks_write([self.task_make('task')])
+        self.repo.update_ids()
+
+        self.conf.freeze()
+        self.server = daemon.Server(self.conf, self.repo)
+
+    def _request(self, conf = None, **fields):
+        """
+        Send the request client_run() would send for 'list -f jsonl', with
+        the given fields replaced, to the server. Return the response and
+        the command output.
+        """
+        req = {
+            'version'  : daemon.PROTOCOL_VERSION,
+            'argv'     : ['list', '-f', 'jsonl'],
+            'config'   : daemon._config_hash(conf or self.conf),
+            'env'      : { var : os.environ.get(var) for var in daemon._ENV_SHARED },
+            'encoding' : 'utf-8',
+        }
+        req.update(fields)
+
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+
+        client, conn = socket.socketpair()
+        with client, conn:
+            socket.send_fds(client, [daemon._frame_pack(req)], [out_w, err_w])
+            os.close(out_w)
+            os.close(err_w)
+
+            self.server._handle(conn)
+            resp = daemon._frame_recv(client)
+
+        with open(out_r, 'r') as out, open(err_r, 'r') as err:
+            return resp, out.read(), err.read()
+
+    def test_run(self):
+        resp, out, err = self._request()
+        self.assertEqual(resp, { 'status' : 'done', 'exit' : 0 })
+        self.assertEqual([json.loads(line)['text'] for line in out.splitlines()], ['task'])
+        self.assertEqual(err, '')
+
+    def test_config_mismatch(self):
+        conf = config.Config()
+        conf['repo_path']                   = self.path
+        conf['lib.urgency.factors.blocked'] = '-7.0'
+        conf.freeze()
+
+        resp, out, err = self._request(conf)
+        self.assertEqual(resp, { 'status' : 'refused', 'reason' : 'config mismatch' })
+        self.assertEqual(out, '')
+
+    def test_env_mismatch(self):
+        env = { var : os.environ.get(var) for var in daemon._ENV_SHARED }
+        env['TZ'] = 'Europe/Prague' if env['TZ'] != 'Europe/Prague' else 'UTC'
+
+        resp, out, err = self._request(env = env)
+        self.assertEqual(resp, { 'status' : 'refused', 'reason' : 'environment mismatch' })
+        self.assertEqual(out, '')
+
+    def test_version_mismatch(self):
+        resp, out, err = self._request(version = daemon.PROTOCOL_VERSION + 1)
+        self.assertEqual(resp, { 'status' : 'refused', 'reason' : 'protocol version mismatch' })
+        self.assertEqual(out, '')
+
+    def test_no_daemon(self):
+        self.assertIsNone(daemon.client_run(self.conf, ['list']))
+
+if __name__ == '__main__':
+    unittest.main()
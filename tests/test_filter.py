@@ -0,0 +1,140 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests of the filter expressions, run from the top-level source directory with
+    python3 -m unittest
+"""
+
+import unittest
+
+from tdlib.repo                import filter as task_filter
+from tdlib.repo.repository_mod import TaskWrite, TaskDelete
+from tdlib.repo.task           import StandaloneTask
+
+from .common import RepositoryTestCase, days
+
+def _date(n):
+    """
+    Get the local date n days from now, as accepted by the date terms.
+    """
+    return days(n).astimezone().date().isoformat()
+
+class PlannerTest(RepositoryTestCase):
+    """
+    The tasks found through the index are the same as those found by
+    checking the filter on every task.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        tags  = ((), ('home',), ('home.garden',), ('work',), ('work', 'home.garden'))
+        words = ('alpha', 'Beta', 'gamma delta', 'ALPHA beta')
+
+        tasks = []
+        for i in range(40):
+            t = self.task_make('task %d %s' % (i, words[i % len(words)]), tags[i % len(tags)])
+            if i % 3 == 0 and tasks:
+                t.dependencies.add(tasks[i // 2].uuid)
+            if i % 4 == 1:
+                t.date_due = days(i - 20)
+            if i % 5 == 2:
+                t.date_scheduled = days(20 - i)
+            if i % 6 == 5:
+                t.completed      = True
+                t.date_completed = days(-i)
+            tasks.append(t)
+        self.tasks = tasks
+
+        self.tasks_write(tasks)
+
+    def assertPlanned(self, *exprs):
+        """
+        exprs are filter expressions, either as a list of terms or as a
+        string split on whitespace.
+        """
+        state = self.repo.load()
+        every = state.tasks_filter(['status:any'])
+
+        for expr in exprs:
+            with self.subTest(expr = expr):
+                if isinstance(expr, str):
+                    expr = expr.split()
+                f = task_filter.TaskFilter(expr)
+
+                expected = [t.uuid for t in every
+                            if f.task_match(t) and (not t.completed or f.match_completed())]
+                self.assertEqual([t.uuid for t in state.tasks_filter(expr)], expected)
+
+    def test_lookups(self):
+        self.assertPlanned('1,5,7', 'id:3', 'id:1000', 'uuid:' + self.tasks[4].uuid,
+                           'uuid:' + self.tasks[5].uuid, '+home', '+home.garden', '+work,home',
+                           'tag:nothing', 'flag:blocked', 'flag:blocking')
+
+    def test_operators(self):
+        self.assertPlanned('+home and flag:blocked', '+work or 1,2', 'not +home',
+                           '+home and not flag:blocking', '( +work or flag:blocked ) and alpha',
+                           'urgency.above:1 or +home', 'alpha and 3,4,5,6')
+
+    def test_dates(self):
+        self.assertPlanned('due:' + _date(-15), 'due:' + _date(5), 'due.before:' + _date(0),
+                           'due.after:' + _date(0), 'scheduled.before:' + _date(-3),
+                           'scheduled.after:' + _date(10), 'created:' + _date(-1),
+                           'created.after:' + _date(1), 'due.after:%sT12:00' % _date(-7),
+                           'due.before:' + _date(10) + ' and +home',
+                           'due.after:' + _date(0) + ' or scheduled.after:' + _date(0),
+                           'not due.before:' + _date(3))
+
+    def test_text(self):
+        self.assertPlanned('alpha', 'text:Beta', 'text.icase:beta', 'text.icase:ALPHA',
+                           ['text.icase:alpha beta'], 'text:ta', 'text:changed', 'text:nothing',
+                           'alpha and +home', 'text.icase:beta or flag:blocked',
+                           'status:completed and text.icase:alpha', 'status:any and not alpha')
+
+    def test_status(self):
+        self.assertPlanned('status:pending', 'status:completed', 'status:any',
+                           'not status:pending', 'status:completed and +home',
+                           'status:any and flag:blocked', 'status:completed or 1,2',
+                           'status:completed and 1,2,3,4,5,6,7,8,9,10,11,12',
+                           'status:any and uuid:' + self.tasks[5].uuid,
+                           'status:completed and due.before:' + _date(0),
+                           'status:completed and not status:completed',
+                           '( status:completed or +work ) and alpha',
+                           'urgency.above:-100 and status:any')
+
+class TextIndexPlannerTest(PlannerTest):
+    """
+    The same, with the text index enabled and updated by a modification.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        self.conf['lib.text_index'] = 'true'
+
+        # builds the index from the commit
+        state = self.repo.load()
+        state.tasks_filter(['alpha'])
+
+        mod_list = [TaskDelete(self.tasks[8].uuid)]
+        for t in (self.tasks[3], self.tasks[11]):
+            t = StandaloneTask(parent = t)
+            t.text = 'changed'
+            mod_list.append(TaskWrite(t))
+        state.modify(mod_list, 'change')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests of the pending task list, run from the top-level source directory with
+    python3 -m unittest
+"""
+
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from tdlib.repo import pending, transaction
+
+class PendingTest(unittest.TestCase):
+    """
+    Pending behaves as the list of UUIDs in the pending file and writes it
+    once, only if changed.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix = 'td-test-')
+        self.addCleanup(shutil.rmtree, self.dir)
+
+        self.path = os.path.join(self.dir, 'pending')
+        with open(self.path, 'w') as f:
+            f.write('a\nb\nc\n')
+
+    def _write(self, p):
+        txn = transaction.Transaction(self.dir)
+        ret = p.write(txn)
+        txn.write_files()
+        return ret
+
+    def test_order(self):
+        p = pending.Pending(self.path)
+        self.assertEqual(list(p), ['a', 'b', 'c'])
+
+        del p['b']
+        p.add('d')
+        p.add('a')
+        self.assertEqual(list(p), ['c', 'd', 'a'])
+        self.assertEqual(sorted(p, key = p.position), ['c', 'd', 'a'])
+        self.assertIn('d', p)
+        self.assertNotIn('b', p)
+        self.assertEqual(len(p), 3)
+
+        self.assertTrue(self._write(p))
+        self.assertEqual(list(pending.Pending(self.path)), ['c', 'd', 'a'])
+
+    def test_write_unchanged(self):
+        p = pending.Pending(self.path)
+        self.assertFalse(self._write(p))
+
+        p.add('d')
+        self.assertTrue(self._write(p))
+        self.assertFalse(self._write(p))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests of the report output cache, run from the top-level source directory with
+    python3 -m unittest
+"""
+
+import os
+import os.path
+import shutil
+import tempfile
+import time
+import unittest
+
+from tdlib.repo                import stamp
+from tdlib.repo.repository_mod import TaskWrite
+from tdlib.repo.task           import StandaloneTask
+from tdlib.utils               import pickle_file, report_cache
+
+from .common import RepositoryTestCase
+
+class ReportCacheTest(unittest.TestCase):
+    """
+    Entries are only returned until they expire.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix = 'td-test-')
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.cache = report_cache.ReportCache(self.path, 3600, 1024 * 1024)
+
+    def test_lookup(self):
+        self.cache.store('key', 'output', time.time() + 60)
+        self.assertEqual(self.cache.lookup('key'), 'output')
+        self.assertIsNone(self.cache.lookup('other'))
+
+    def test_expired(self):
+        self.cache.store('key', 'output', time.time() - 1)
+        self.assertIsNone(self.cache.lookup('key'))
+
+        pickle_file.store(os.path.join(self.path, 'key'),
+                          (report_cache.REPORT_CACHE_VERSION, time.time() - 1, 'output'))
+        self.assertIsNone(self.cache.lookup('key'))
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_version(self):
+        pickle_file.store(os.path.join(self.path, 'key'),
+                          (report_cache.REPORT_CACHE_VERSION - 1, time.time() + 60, 'output'))
+        self.assertIsNone(self.cache.lookup('key'))
+
+    def test_evict(self):
+        cache = report_cache.ReportCache(self.path, 3600, 4096)
+        for i in range(10):
+            cache.store('key%d' % i, 'x' * 1024, time.time() + 60)
+            # the entries are ordered by their modification time
+            mtime = time.time() - 100 + i
+            os.utime(os.path.join(self.path, 'key%d' % i), (mtime, mtime))
+
+        self.assertEqual(cache.lookup('key9'), 'x' * 1024)
+        self.assertIsNone(cache.lookup('key0'))
+        self.assertLess(len(os.listdir(self.path)), 4)
+
+class KeyTest(RepositoryTestCase):
+    """
+    The cache key changes with the repository state and the values passed to
+    key_make(), but not by just loading the repository.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        self.task = self.task_make('task')
+        self.tasks_write([self.task])
+        self.repo.update_ids()
+
+    def _key(self, *parts):
+        return report_cache.key_make(stamp.repo_stamp(self.path), *parts)
+
+    def test_unchanged(self):
+        key = self._key()
+
+        state = self.repo.load()
+        state.tasks_filter([])
+        self.assertFalse(self.repo.update_ids())
+
+        self.assertIsNotNone(key)
+        self.assertEqual(self._key(), key)
+
+    def test_parts(self):
+        self.assertNotEqual(self._key('list'), self._key('next'))
+        self.assertIsNone(report_cache.key_make(None, 'list'))
+
+    def test_modify(self):
+        key = self._key()
+
+        t = StandaloneTask(parent = self.task)
+        t.text = 'changed'
+        self.repo.load().modify([TaskWrite(t)], 'change')
+
+        self.assertNotEqual(self._key(), key)
+
+    def test_update_ids(self):
+        t = StandaloneTask(parent = self.task)
+        t.completed = True
+        self.repo.load().modify([TaskWrite(t)], 'done')
+        self.assertTrue(self.repo.update_ids())
+
+        # the key the report stores its output under after updating the IDs
+        # is the one the next run looks up
+        state = self.repo.load()
+        self.assertEqual(report_cache.key_make(state.clean_stamp), self._key())
+
+    def test_out_of_band(self):
+        key = self._key()
+
+        with open(os.path.join(self.path, 'pending'), 'a') as f:
+            f.write('garbage\n')
+
+        self.assertNotEqual(self._key(), key)
+
+    def _tz_restore(self, tz):
+        if tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = tz
+
+    def test_timezone(self):
+        self.addCleanup(self._tz_restore, os.environ.get('TZ'))
+
+        os.environ['TZ'] = 'UTC'
+        key = self._key()
+        os.environ['TZ'] = 'Europe/Prague'
+        self.assertNotEqual(self._key(), key)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests of the loaded repository state, run from the top-level source directory
+with
+    python3 -m unittest
+"""
+
+import json
+import math
+import os.path
+import pygit2
+import unittest
+
+from tdlib.repo                import repository, snapshot
+from tdlib.repo.repository_mod import TaskWrite, TaskDelete
+from tdlib.repo.task           import StandaloneTask
+
+from .common import RepositoryTestCase, days, task_fields
+
+class PendingUpdateTest(RepositoryTestCase):
+    """
+    The pending tasks updated by modify() are the same as those loaded from
+    scratch afterwards.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        a = self.task_make('a')
+        b = self.task_make('b', dependencies = (a.uuid,))
+        c = self.task_make('c', ('home',), (b.uuid,))
+        d = self.task_make('d', date_due = days(60))
+        e = self.task_make('e', date_scheduled = days(-10))
+        f = self.task_make('f', completed = True, date_completed = days(-2))
+        # unchanged, but blocked by the tasks that are completed or reopened
+        h = self.task_make('h', dependencies = (a.uuid,))
+        i = self.task_make('i', dependencies = (f.uuid,))
+        self.tasks = { t.text : t for t in (a, b, c, d, e, f, h, i) }
+
+        self.tasks_write(self.tasks.values())
+
+    def _modify(self, state):
+        tasks = self.tasks
+
+        done = StandaloneTask(parent = tasks['a'])
+        done.completed      = True
+        done.date_completed = days(0)
+
+        b = StandaloneTask(parent = tasks['b'])
+        del b.dependencies[tasks['a'].uuid]
+        b.dependencies.add(tasks['e'].uuid)
+
+        c = StandaloneTask(parent = tasks['c'])
+        c.text = 'c changed'
+        c.tags.add('work')
+
+        reopened = StandaloneTask(parent = tasks['f'])
+        reopened.completed      = False
+        reopened.date_completed = None
+
+        g = self.task_make('g', dependencies = (c.uuid, tasks['d'].uuid))
+
+        state.modify([TaskWrite(done), TaskWrite(b), TaskWrite(c), TaskDelete(tasks['d'].uuid),
+                      TaskWrite(reopened), TaskWrite(g)], 'modify')
+
+    def _check(self, state):
+        fresh = self.load_fresh().tasks_filter([])
+
+        self.assertEqual(list(state._pending), [t.uuid for t in fresh])
+        self.assertEqual([task_fields(state._pending_tasks[t.uuid]) for t in fresh],
+                         [task_fields(t) for t in fresh])
+
+    def test_graph_loaded(self):
+        state = self.repo.load()
+        for t in state.tasks_filter([]):
+            t.urgency
+
+        self._modify(state)
+        self._check(state)
+
+    def test_graph_not_loaded(self):
+        state = self.repo.load()
+
+        self._modify(state)
+        self._check(state)
+
+    def test_reload(self):
+        state = self.repo.load()
+        state.tasks_filter(['flag:blocked'])
+
+        self._modify(state)
+
+        # loaded from the snapshot stored by modify()
+        state = self.repo.load()
+        state.tasks_filter([])
+        self._check(state)
+
+class OutOfBandTest(RepositoryTestCase):
+    """
+    Changes made to the repository without td are noticed by the clean stamp
+    and the snapshot.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        self.task = self.task_make('task', ('home',), date_due = days(60))
+        self.tasks_write([self.task, self.task_make('other')])
+
+        # writes the clean stamp and the snapshot
+        state = self.repo.load()
+        for t in state.tasks_filter([]):
+            t.urgency
+
+    def _task_path(self):
+        return os.path.join(self.path, 'tasks', self.task.uuid)
+
+    def test_dirty_pending(self):
+        with open(os.path.join(self.path, 'pending'), 'a') as f:
+            f.write('garbage\n')
+
+        with self.assertRaises(repository.DirtyRepositoryError):
+            self.repo.load()
+
+    def test_dirty_task_paranoid(self):
+        # a task file modified in place is only noticed by the full scan
+        with open(self._task_path(), 'a') as f:
+            f.write('\n')
+
+        with self.assertRaises(repository.DirtyRepositoryError):
+            repository.Repository(self.path, self.conf['lib'], paranoid = True).load()
+
+    def test_commit(self):
+        with open(self._task_path(), 'r') as f:
+            data = json.load(f)
+        data['text']     = 'changed'
+        data['date_due'] = days(-60).isoformat()
+        with open(self._task_path(), 'w') as f:
+            json.dump(data, f)
+
+        repo = pygit2.Repository(self.path)
+        repo.index.add(os.path.join('tasks', self.task.uuid))
+        repo.index.write()
+        sig = repo.default_signature
+        repo.create_commit('HEAD', sig, sig, 'change', repo.index.write_tree(), [repo.head.target])
+
+        state  = self.repo.load()
+        loaded = [task_fields(t) for t in state.tasks_filter([])]
+        self.assertEqual(loaded, [task_fields(t) for t in self.load_fresh().tasks_filter([])])
+        self.assertEqual(state.tasks_filter(['uuid:' + self.task.uuid])[0].text, 'changed')
+
+class UrgencyCacheTest(RepositoryTestCase):
+    """
+    The urgency values cached in the snapshot are only used while valid.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        a = self.task_make('a', date_due = days(60))
+        b = self.task_make('b', dependencies = (a.uuid,), date_scheduled = days(-10))
+        self.tasks_write([a, b])
+
+        self.repo.load().urgency_next_change()
+
+    def _urgency(self, state):
+        return { t.uuid : t.urgency for t in state.tasks_filter([]) }
+
+    def _snapshot_urgency_set(self, val, expiry):
+        gitdir = os.path.join(self.path, '.git')
+        snap   = snapshot.load(gitdir)
+        snap.urgency = { u : (val, expiry) for u in snap.urgency }
+        snapshot.store(gitdir, snap)
+
+    def test_valid(self):
+        self._snapshot_urgency_set(1000.0, math.inf)
+        self.assertEqual(set(self._urgency(self.repo.load()).values()), { 1000.0 })
+
+    def test_expired(self):
+        self._snapshot_urgency_set(1000.0, 0.0)
+        self.assertEqual(self._urgency(self.repo.load()), self._urgency(self.load_fresh()))
+
+    def test_factors(self):
+        expected = self._urgency(self.repo.load())
+
+        self.conf['lib.urgency.factors.blocked'] = '-7.0'
+
+        urgency = self._urgency(self.repo.load())
+        self.assertEqual(urgency, self._urgency(self.load_fresh()))
+        self.assertNotEqual(urgency, expected)
+
+if __name__ == '__main__':
+    unittest.main()
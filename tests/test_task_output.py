@@ -0,0 +1,63 @@
+# Copyright (C) 2016 Anton Khirnov <anton@khirnov.net>
+#
+# td is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# td is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along
+# with td. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests of the task list sorting, run from the top-level source directory with
+    python3 -m unittest
+"""
+
+import random
+import types
+import unittest
+
+from tdlib.utils import task_output
+
+class TasksSortTest(unittest.TestCase):
+    """
+    Sorting with a limit selects the same tasks in the same order as a full
+    sort cut to the limit.
+    """
+
+    def setUp(self):
+        rnd = random.Random(42)
+
+        # with ties and tasks without the values
+        self.tasks = []
+        for i in range(200):
+            self.tasks.append(types.SimpleNamespace(
+                name    = i,
+                id      = None if i % 7 == 0 else i,
+                urgency = None if i % 11 == 0 else rnd.choice((-5.0, 0.0, 0.5, 8.0, 12.5)),
+                text    = rnd.choice(('a', 'b', 'c')),
+            ))
+        rnd.shuffle(self.tasks)
+
+    def test_limit(self):
+        for sort in ('id+', 'id-', 'urgency+', 'urgency-', 'text+', 'text-'):
+            full = task_output.tasks_sort(self.tasks, sort)
+
+            for limit in (0, 1, 5, 30, 199, 200, 500):
+                with self.subTest(sort = sort, limit = limit):
+                    top = task_output.tasks_sort(iter(self.tasks), sort, limit)
+                    self.assertEqual([t.name for t in top], [t.name for t in full[:limit]])
+
+    def test_missing_last(self):
+        for sort in ('urgency+', 'urgency-'):
+            full = task_output.tasks_sort(self.tasks, sort)
+            vals = [t.urgency for t in full]
+            self.assertEqual(set(vals[vals.index(None):]), { None })
+
+if __name__ == '__main__':
+    unittest.main()